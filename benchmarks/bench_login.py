@@ -0,0 +1,82 @@
+"""
+Login throughput benchmark for choosing the password hashing cost.
+
+Runs logins through the Flask test client against a throwaway SQLite
+database for each hashing method given, from several threads at once, and
+prints logins per second with median and p95 latency.
+
+    python benchmarks/bench_login.py --logins 200 --concurrency 8 \\
+        --method scrypt --method scrypt:16384:8:1 --method pbkdf2:sha256:600000
+
+Author(s): Purple T-Pythons Team
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+
+def run(method, logins, concurrency, workers):
+    from app import create_app, db
+    from app.models import User
+
+    app = create_app()
+    app.config['PASSWORD_HASH_METHOD'] = method
+    app.config['PASSWORD_HASH_WORKERS'] = workers
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.commit()
+
+    def login(_):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', data={'email': 'bench@example.com',
+                                               'password': 'bench-password'})
+        assert response.status_code == 302, response.status_code
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        db.drop_all()
+    return {
+        'method': method,
+        'logins_per_second': logins / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--method', action='append',
+                        help='Werkzeug hash method to measure (repeatable).')
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='PASSWORD_HASH_WORKERS for the run (0 hashes inline).')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        print(f"{'method':<28} {'logins/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+        for method in args.method or ['scrypt', 'pbkdf2:sha256:600000']:
+            result = run(method, args.logins, args.concurrency, args.workers)
+            print(f"{result['method']:<28} {result['logins_per_second']:>10.1f} "
+                  f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
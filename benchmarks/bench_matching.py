@@ -0,0 +1,92 @@
+"""
+Match scoring latency over a large synthetic shelter.
+
+Fills a feature matrix with synthetic available pets, then times ranking
+the best matches for a spread of adopter preferences, then applying single
+pet updates, the two things a request to ``/matches`` can pay for. The
+first ranking on each keyword also pays for building its posting array. No
+database is involved; the matrix is filled directly.
+
+    python benchmarks/bench_matching.py --pets 100k --rounds 200
+
+Author(s): Purple T-Pythons Team
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_routes import parse_size  # noqa: E402
+
+WORDS = ('calm', 'playful', 'gentle', 'shy', 'energetic', 'children', 'cats', 'dogs', 'senior',
+         'cuddly', 'quiet', 'trained', 'loyal', 'curious', 'independent', 'friendly')
+
+
+def synthetic_pet(pet_id, rng, now):
+    return SimpleNamespace(
+        id=pet_id, status='available', species=rng.choice(('Dog', 'Cat')),
+        age_months=rng.choice((None, *range(1, 180))), gender=rng.choice(('Male', 'Female', None)),
+        vaccinated=rng.random() < 0.7, spayed_neutered=rng.random() < 0.5,
+        name=f'Pet {pet_id}', breed='Mixed', description=' '.join(rng.sample(WORDS, 4)),
+        created_at=now - timedelta(minutes=pet_id), updated_at=now,
+    )
+
+
+def preference(rng):
+    low = rng.choice((None, 0, 12, 36))
+    return SimpleNamespace(
+        species=rng.choice(('Dog', 'Cat', None)), min_age_months=low,
+        max_age_months=None if low is None else low + rng.choice((12, 48, 96)),
+        gender=rng.choice(('Male', 'Female', None)), vaccinated=rng.random() < 0.5,
+        spayed_neutered=rng.random() < 0.5, keywords=' '.join(rng.sample(WORDS, 2)),
+    )
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000)
+
+
+def main():
+    from app.matching import FeatureMatrix
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pets', type=parse_size, default=parse_size('100k'))
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    matrix = FeatureMatrix()
+    started = time.perf_counter()
+    for pet_id in range(1, args.pets + 1):
+        matrix.upsert(synthetic_pet(pet_id, rng, now))
+    print(f'built matrix of {len(matrix)} pets in {time.perf_counter() - started:.2f}s')
+
+    ranking, updates = [], []
+    for _ in range(args.rounds):
+        wanted = preference(rng)
+        started = time.perf_counter()
+        matrix.top(wanted, args.limit)
+        ranking.append(time.perf_counter() - started)
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        matrix.upsert(synthetic_pet(rng.randint(1, args.pets), rng, now))
+        updates.append(time.perf_counter() - started)
+
+    for label, samples in (('rank top matches', ranking), ('update one pet', updates)):
+        p50, p95 = percentiles(samples)
+        print(f'{label:18} p50 {p50:7.3f} ms  p95 {p95:7.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Concurrent registration load test.
+
+Registers users from many threads at once through the Flask test client
+against a throwaway SQLite database. Every distinct user is registered
+``--attempts`` times concurrently, so the run checks correctness under
+contention (exactly one account per email, every loser shown the
+duplicate message) as well as measuring throughput.
+
+    python benchmarks/bench_register.py --users 200 --attempts 3 --concurrency 16
+
+Author(s): Purple T-Pythons Team
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--attempts', type=int, default=3,
+                        help='Concurrent registrations per distinct user.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--method', default='pbkdf2:sha256:1000',
+                        help='Password hash method; cheap by default to isolate the database path.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        from app import create_app, db
+        from app.models import User
+
+        app = create_app()
+        app.config['PASSWORD_HASH_METHOD'] = args.method
+
+        attempts = [i for i in range(args.users) for _ in range(args.attempts)]
+        random.shuffle(attempts)
+
+        def register(i):
+            client = app.test_client()
+            started = time.perf_counter()
+            response = client.post('/register', data={
+                'username': f'user{i}', 'email': f'user{i}@example.com',
+                'password': 'password', 'role': 'adopter',
+            })
+            elapsed = time.perf_counter() - started
+            with client.session_transaction() as sess:
+                messages = [message for _, message in sess.get('_flashes', [])]
+            if 'Account created successfully!' in messages:
+                return 'created', elapsed
+            if 'Email already registered.' in messages:
+                return 'duplicate', elapsed
+            return f'error {response.status_code}', elapsed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(register, attempts))
+        elapsed = time.perf_counter() - started
+
+        outcomes = [outcome for outcome, _ in results]
+        latencies = sorted(latency for _, latency in results)
+        with app.app_context():
+            accounts = User.query.count()
+            db.drop_all()
+
+    print(f"{len(attempts)} registrations in {elapsed:.2f}s "
+          f"({len(attempts) / elapsed:.1f}/s, p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms)")
+    print(f"created={outcomes.count('created')} duplicate={outcomes.count('duplicate')} "
+          f"errors={len(outcomes) - outcomes.count('created') - outcomes.count('duplicate')} "
+          f"accounts={accounts}")
+
+    assert accounts == args.users, 'every distinct user should have exactly one account'
+    assert outcomes.count('created') == args.users, 'exactly one attempt per user should succeed'
+    assert outcomes.count('duplicate') == len(attempts) - args.users, 'losers should see the duplicate message'
+
+
+if __name__ == '__main__':
+    main()
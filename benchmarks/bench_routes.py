@@ -0,0 +1,326 @@
+"""
+Route benchmark suite over synthetic shelter inventories.
+
+Seeds a throwaway SQLite database with ``--pets`` synthetic pets (``1k``,
+``100k`` and ``1M`` style sizes are accepted) and ``--users`` adopters, then
+requests every page of the app through the Flask test client as an admin,
+an adopter or an anonymous visitor. For each route it records latency
+percentiles over ``--requests`` timed requests, the SQL statements per
+request and the peak memory traced while serving one request.
+
+Pet deletion is not measured: each timed request would need a fresh pet,
+and deleting the same one again only times a 404. ``/events/pets`` is
+timed with streams closed once the backlog is sent, and ``export csv``
+streams the whole catalogue, so expect it to dominate at large sizes.
+
+Results are written as JSON with ``--output`` and can be compared against
+an earlier run with ``--compare``; routes slower than ``--threshold``
+percent at p50 or p95, or running more queries, are reported as
+regressions and make the script exit with status 1.
+
+    python benchmarks/bench_routes.py --pets 100k --users 1000 --output baseline.json
+    python benchmarks/bench_routes.py --pets 100k --users 1000 --compare baseline.json
+
+Author(s): Purple T-Pythons Team
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+BREEDS = {
+    'Dog': ('Labrador', 'Beagle', 'Husky', 'Collie', 'Poodle', 'Boxer', 'Mixed'),
+    'Cat': ('Tabby', 'Siamese', 'Persian', 'Maine Coon', 'Bengal', 'Mixed'),
+}
+WORDS = ('friendly', 'playful', 'calm', 'loves', 'walks', 'cuddles', 'shy', 'energetic',
+         'children', 'garden', 'quiet', 'home', 'trained', 'gentle', 'curious')
+STATUS_WEIGHTS = (('available', 80), ('pending', 10), ('adopted', 10))
+
+
+def parse_size(value):
+    """Parse counts such as ``1000``, ``100k`` or ``1M``."""
+    value = value.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * scale)
+
+
+def synthetic_pets(count, seed=42):
+    """Yield insert parameter dicts for ``count`` plausible pets."""
+    from app.models import age_to_months
+
+    rng = random.Random(seed)
+    statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+    now = datetime.utcnow()
+    for i in range(count):
+        species = 'Dog' if rng.random() < 0.55 else 'Cat'
+        unit = 'months' if rng.random() < 0.2 else 'years'
+        value = rng.randint(2, 11) if unit == 'months' else rng.randint(1, 15)
+        age = f"{value} {unit if value != 1 else unit[:-1]}"
+        created = now - timedelta(minutes=count - i)
+        yield {
+            'name': f'Pet {i}', 'species': species, 'breed': rng.choice(BREEDS[species]),
+            'age': age, 'age_months': age_to_months(age),
+            'gender': rng.choice(('Male', 'Female')),
+            'spayed_neutered': rng.random() < 0.6, 'vaccinated': rng.random() < 0.7,
+            'description': ' '.join(rng.choices(WORDS, k=12)).capitalize() + '.',
+            'status': rng.choice(statuses), 'image_url': None, 'image_key': None,
+            'created_at': created, 'updated_at': created,
+        }
+
+
+def seed(db, pets, users, batch_size=10_000):
+    """Bulk insert the synthetic inventory and users; returns (admin id, adopter id)."""
+    from sqlalchemy import insert, select
+    from app.models import AdopterPreference, Pet, User
+
+    batch = []
+    for row in synthetic_pets(pets):
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.execute(insert(Pet), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(insert(Pet), batch)
+        db.session.commit()
+
+    # Every synthetic user shares one hash; logins are not what is measured
+    template = User(username='template', email='template@example.com')
+    template.set_password('bench-password')
+    db.session.execute(insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com',
+         'password_hash': template.password_hash, 'is_admin': i == 0}
+        for i in range(max(users, 2))
+    ])
+    ids = dict(db.session.execute(
+        select(User.username, User.id).where(User.username.in_(('user0', 'user1')))).all())
+    # Give the adopter preferences so /matches ranks instead of redirecting
+    db.session.merge(AdopterPreference(user_id=ids['user1'], species='Dog', min_age_months=12,
+                                       max_age_months=48, vaccinated=True, keywords='calm gentle'))
+    db.session.commit()
+    return ids['user0'], ids['user1']
+
+
+def routes(pet_id, cursor):
+    """(name, role, method, url, form data) for every route measured."""
+    return [
+        ('index', None, 'GET', '/', None),
+        ('login form', None, 'GET', '/login', None),
+        ('register form', None, 'GET', '/register', None),
+        ('login', None, 'POST', '/login',
+         {'email': 'user1@example.com', 'password': 'bench-password'}),
+        ('admin dashboard', 'admin', 'GET', '/dashboard', None),
+        ('adopter dashboard', 'adopter', 'GET', '/dashboard', None),
+        ('dogs', 'adopter', 'GET', '/dogs', None),
+        ('dogs page 2', 'adopter', 'GET', f'/dogs?after={cursor}', None),
+        ('dogs filtered', 'adopter', 'GET', '/dogs?age=1-3&gender=Female&vaccinated=1', None),
+        ('cats', 'adopter', 'GET', '/cats', None),
+        ('search', 'adopter', 'GET', '/search?q=playful+lab', None),
+        ('preferences form', 'adopter', 'GET', '/preferences', None),
+        ('matches', 'adopter', 'GET', '/matches', None),
+        ('saved searches', 'adopter', 'GET', '/saved-searches', None),
+        ('save search', 'adopter', 'POST', '/saved-searches',
+         {'species': 'Dog', 'age': '1-3', 'vaccinated': '1'}),
+        ('pet events', 'adopter', 'GET', '/events/pets?last_event_id=0', None),
+        ('api pets', 'adopter', 'GET', '/api/v1/pets?species=dog', None),
+        ('api pets sparse', 'adopter', 'GET', '/api/v1/pets?fields=name,breed&limit=100', None),
+        ('api pet', 'adopter', 'GET', f'/api/v1/pets/{pet_id}', None),
+        ('api search', 'adopter', 'GET', '/api/v1/pets/search?q=calm', None),
+        ('add pet form', 'admin', 'GET', '/pet/add', None),
+        ('add pet', 'admin', 'POST', '/pet/add',
+         {'name': 'Bench', 'species': 'Dog', 'age_value': '2', 'age_unit': 'years'}),
+        ('edit pet form', 'admin', 'GET', f'/pet/{pet_id}/edit', None),
+        ('edit pet', 'admin', 'POST', f'/pet/{pet_id}/edit',
+         {'name': 'Edited', 'species': 'Dog', 'age_value': '3', 'age_unit': 'years',
+          'status': 'available'}),
+        ('import form', 'admin', 'GET', '/pets/import', None),
+        ('export csv', 'admin', 'GET', '/pets/export.csv', None),
+        ('metrics', None, 'GET', '/metrics', None),
+    ]
+
+
+def login(app, user_id):
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return client
+
+
+def measure(app, client, method, url, data, requests, warmup, query_counter):
+    """Time one route; returns latencies, statements per request, peak KiB and status."""
+    def call():
+        response = client.open(url, method=method, data=data)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    for _ in range(warmup):
+        call()
+    latencies = []
+    queries = []
+    status = None
+    for _ in range(requests):
+        before = query_counter['count']
+        started = time.perf_counter()
+        status = call()
+        latencies.append(time.perf_counter() - started)
+        queries.append(query_counter['count'] - before)
+
+    # Trace a single extra request for memory so tracing does not skew timings
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, queries, peak / 1024, status
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run(args, tmp):
+    os.environ['DATABASE_URL'] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+    os.environ.setdefault('APP_CONFIG', 'production')
+    os.environ.setdefault('SECRET_KEY', 'bench-secret')
+    os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    # Close event streams after the backlog so /events/pets can be timed like a page
+    os.environ.setdefault('EVENT_STREAM_MAX_SECONDS', '0')
+    from sqlalchemy import event, select
+    from app import create_app, db
+    from app.listings import encode_cursor
+    from app.models import Pet
+
+    app = create_app()
+    app.logger.setLevel('WARNING')
+    with app.app_context():
+        started = time.perf_counter()
+        admin_id, adopter_id = seed(db, args.pets, args.users)
+        seed_seconds = time.perf_counter() - started
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        pet = db.session.execute(
+            select(Pet.id, Pet.created_at).where(Pet.species == 'Dog', Pet.status == 'available')
+            .order_by(Pet.created_at.desc(), Pet.id.desc()).offset(app.config['PETS_PER_PAGE'] - 1)
+            .limit(1)).one()
+        query_counter = {'count': 0}
+
+        @event.listens_for(db.engine, 'after_cursor_execute')
+        def count_query(*_):
+            query_counter['count'] += 1
+
+    clients = {None: login(app, None), 'admin': login(app, admin_id),
+               'adopter': login(app, adopter_id)}
+    results = {}
+    for name, role, method, url, data in routes(pet.id, encode_cursor(pet.created_at, pet.id)):
+        if args.route and name not in args.route:
+            continue
+        latencies, queries, peak_kib, status = measure(
+            app, clients[role], method, url, data, args.requests, args.warmup, query_counter)
+        latencies.sort()
+        results[name] = {
+            'method': method, 'url': url, 'status': status,
+            'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'queries': max(queries),
+            'peak_kib': round(peak_kib, 1),
+        }
+        print_row(name, results[name])
+
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+    return {
+        'meta': {
+            'pets': args.pets, 'users': args.users, 'requests': args.requests,
+            'seed_seconds': round(seed_seconds, 2),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(), 'recorded_at': datetime.utcnow().isoformat(),
+        },
+        'routes': results,
+    }
+
+
+HEADER = (f"{'route':<20} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'queries':>8} {'peak KiB':>9}")
+
+
+def print_row(name, result):
+    print(f"{name:<20} {result['status']:>6} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+          f"{result['p99_ms']:>9.2f} {result['queries']:>8} {result['peak_kib']:>9.1f}")
+
+
+def compare(current, baseline, threshold):
+    """Print per-route changes against ``baseline``; return the regressed route names."""
+    if current['meta']['pets'] != baseline['meta']['pets']:
+        print(f"warning: baseline has {baseline['meta']['pets']} pets, this run "
+              f"{current['meta']['pets']}", file=sys.stderr)
+    print(f"\n{'route':<20} {'p50 change':>11} {'p95 change':>11} {'queries':>9}")
+    regressions = []
+    for name, result in current['routes'].items():
+        old = baseline['routes'].get(name)
+        if old is None:
+            continue
+        changes = [(result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                   for key in ('p50_ms', 'p95_ms')]
+        regressed = (any(change > threshold for change in changes)
+                     or result['queries'] > old['queries'])
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<20} {changes[0]:>+10.1f}% {changes[1]:>+10.1f}% "
+              f"{old['queries']:>4}->{result['queries']:<4}{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pets', type=parse_size, default=parse_size('1k'),
+                        help='Synthetic pets to seed, e.g. 1k, 100k or 1M.')
+    parser.add_argument('--users', type=parse_size, default=100)
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--route', action='append',
+                        help='Only measure this route (repeatable); names as printed.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', help='Baseline JSON file from an earlier run.')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='Percent slowdown at p50 or p95 counted as a regression.')
+    args = parser.parse_args()
+
+    print(f'Seeding {args.pets} pets and {args.users} users...')
+    print(HEADER)
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run(args, tmp)
+    print(f"(seeded in {result['meta']['seed_seconds']}s)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} route(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+SQLite read throughput under concurrent writes.
+
+Seeds a throwaway database with pets, then for a fixed duration runs
+reader threads paging through the adopter listing query while writer
+threads edit pets and commit, the way admins do. Each run is repeated with
+the engine tuning off (rollback journal, default pragmas) and on (WAL,
+``synchronous=NORMAL``, busy timeout, mmap and cache size), and prints
+reads and writes per second, read latency percentiles and lock errors.
+
+    python benchmarks/bench_sqlite_concurrency.py --pets 5000 --readers 8 --writers 2 --seconds 10
+
+Author(s): Purple T-Pythons Team
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+
+def seed(db, pets):
+    from app.models import Pet
+
+    species = ('Dog', 'Cat')
+    db.session.add_all(
+        Pet(name=f'Pet {i}', species=species[i % 2], breed='Mixed', age=f'{i % 15 + 1} years',
+            gender=('Male', 'Female')[i % 3 % 2], description='Friendly and playful.',
+            status='Available', spayed_neutered=bool(i % 2), vaccinated=bool(i % 3))
+        for i in range(pets)
+    )
+    db.session.commit()
+
+
+def run(tuned, args, tmp):
+    from sqlalchemy import update
+    from sqlalchemy.exc import OperationalError
+    from app import create_app, db
+    from app.listings import listing_select, paginate
+    from app.models import Pet
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{Path(tmp) / ('tuned.db' if tuned else 'default.db')}"
+    os.environ['SQLITE_TUNING'] = 'true' if tuned else 'false'
+    app = create_app()
+    with app.app_context():
+        seed(db, args.pets)
+
+    stop = threading.Event()
+    read_latencies = []
+    counts = {'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+
+    def reader():
+        latencies = []
+        with app.app_context():
+            while not stop.is_set():
+                species = random.choice(('Dog', 'Cat'))
+                started = time.perf_counter()
+                try:
+                    page = paginate(listing_select('cards', species=species, status='Available'),
+                                    per_page=20)
+                    # Follow one page forward, as a browsing adopter would
+                    paginate(listing_select('cards', species=species, status='Available'),
+                             after=page.next_cursor, per_page=20)
+                    db.session.rollback()
+                except OperationalError:
+                    db.session.rollback()
+                    with lock:
+                        counts['read_errors'] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+        with lock:
+            read_latencies.extend(latencies)
+
+    def writer():
+        writes = 0
+        with app.app_context():
+            while not stop.is_set():
+                pet_id = random.randint(1, args.pets)
+                try:
+                    db.session.execute(update(Pet).where(Pet.id == pet_id)
+                                       .values(description=f'Edited at {time.time()}'))
+                    db.session.commit()
+                    writes += 1
+                except OperationalError:
+                    db.session.rollback()
+                    with lock:
+                        counts['write_errors'] += 1
+        with lock:
+            counts['writes'] += writes
+
+    threads = ([threading.Thread(target=reader) for _ in range(args.readers)]
+               + [threading.Thread(target=writer) for _ in range(args.writers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+
+    read_latencies.sort()
+    return {
+        'mode': 'tuned' if tuned else 'default',
+        'reads_per_second': len(read_latencies) / args.seconds,
+        'writes_per_second': counts['writes'] / args.seconds,
+        'p50_ms': statistics.median(read_latencies) * 1000 if read_latencies else 0,
+        'p99_ms': read_latencies[int(len(read_latencies) * 0.99) - 1] * 1000 if read_latencies else 0,
+        'errors': counts['read_errors'] + counts['write_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pets', type=int, default=5000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'mode':<8} {'reads/s':>9} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for tuned in (False, True):
+            result = run(tuned, args, tmp)
+            print(f"{result['mode']:<8} {result['reads_per_second']:>9.1f} "
+                  f"{result['writes_per_second']:>9.1f} {result['p50_ms']:>8.2f} "
+                  f"{result['p99_ms']:>8.2f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
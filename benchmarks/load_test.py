@@ -0,0 +1,308 @@
+"""
+Concurrent load test against a locally started production server.
+
+Seeds a throwaway SQLite database with synthetic pets and users, starts the
+app under gunicorn with ``gunicorn.conf.py``, and then ramps through
+``--stages`` of concurrent virtual users. Each virtual user logs in
+through ``/login`` with its own cookie jar and replays weighted journeys
+until the stage ends: adopters browse ``/dogs``, ``/cats`` and
+``/dashboard`` with filters, and a ``--write-ratio`` share of journeys are
+an admin adding, editing or deleting pets. For every stage it prints
+throughput, error rate and latency percentiles, then a per-step breakdown
+over the whole run.
+
+    python benchmarks/load_test.py --pets 10k --workers 4 --stages 1,4,16,32 --stage-seconds 15
+
+The load generator is threaded Python, so on a small machine it can
+saturate before the server does; compare its CPU use with the server's.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_routes import parse_size, seed  # noqa: E402
+
+PASSWORD = 'bench-password'
+
+# (weight, name, steps); each step is (label, method, path, form data or None).
+ADOPTER_JOURNEYS = [
+    (4, 'browse dogs', [('dogs', 'GET', '/dogs', None),
+                        ('dogs filtered', 'GET', '/dogs?age=1-3&vaccinated=1', None)]),
+    (3, 'browse cats', [('cats', 'GET', '/cats', None),
+                        ('cats filtered', 'GET', '/cats?gender=Female', None)]),
+    (2, 'dashboard', [('dashboard', 'GET', '/dashboard', None)]),
+]
+
+
+class Recorder:
+    """Thread-safe store of (step, latency, ok) samples for the current stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, step, seconds, ok):
+        with self._lock:
+            self.samples.append((step, seconds, ok))
+
+    def drain(self):
+        with self._lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+
+class PetPools:
+    """Seeded pet ids split between ones admins edit and ones they may delete."""
+
+    def __init__(self, pets):
+        split = max(1, int(pets * 0.9))
+        self.editable = range(1, split + 1)
+        self._deletable = list(range(split + 1, pets + 1))
+        random.shuffle(self._deletable)
+        self._lock = threading.Lock()
+
+    def take_deletable(self):
+        with self._lock:
+            return self._deletable.pop() if self._deletable else None
+
+
+def admin_journey(pools):
+    choice = random.random()
+    if choice < 0.4:
+        return [('add pet', 'POST', '/pet/add', {
+            'name': f'Load {secrets.token_hex(3)}', 'species': random.choice(('Dog', 'Cat')),
+            'age_value': str(random.randint(1, 12)), 'age_unit': 'years',
+            'description': 'Added by the load test.'})]
+    pet_id = pools.take_deletable() if choice > 0.85 else None
+    if pet_id is not None:
+        return [('delete pet', 'POST', f'/pet/{pet_id}/delete', None)]
+    pet_id = random.choice(pools.editable)
+    return [('edit pet', 'POST', f'/pet/{pet_id}/edit', {
+        'name': f'Edited {pet_id}', 'species': random.choice(('Dog', 'Cat')),
+        'age_value': str(random.randint(1, 12)), 'age_unit': 'years',
+        'status': random.choice(('available', 'available', 'pending')),
+        'description': 'Edited by the load test.'})]
+
+
+class VirtualUser:
+    """One logged-in browser session replaying journeys until told to stop."""
+
+    def __init__(self, base_url, email, is_admin, recorder, pools, timeout):
+        self.base_url = base_url
+        self.email = email
+        self.is_admin = is_admin
+        self.recorder = recorder
+        self.pools = pools
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, label, method, path, data, failed_path=None):
+        """Send one request, following redirects; returns whether it succeeded.
+
+        Redirects ending at ``failed_path`` count as failures, which is how
+        the app answers a rejected form.
+        """
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        if method == 'POST' and body is None:
+            body = b''
+        started = time.perf_counter()
+        url = None
+        try:
+            with self.opener.open(self.base_url + path, data=body, timeout=self.timeout) as response:
+                response.read()
+                url = response.geturl()
+        except (urllib.error.URLError, OSError):
+            pass
+        ok = url is not None and urllib.parse.urlsplit(url).path != failed_path
+        self.recorder.add(label, time.perf_counter() - started, ok)
+        return ok
+
+    def login(self):
+        return self.request('login', 'POST', '/login',
+                            {'email': self.email, 'password': PASSWORD}, failed_path='/login')
+
+    def run(self, stop, write_ratio):
+        weights = [weight for weight, _, _ in ADOPTER_JOURNEYS]
+        while not stop.is_set():
+            if self.is_admin and random.random() < write_ratio:
+                steps = admin_journey(self.pools)
+            else:
+                _, _, steps = random.choices(ADOPTER_JOURNEYS, weights)[0]
+            for label, method, path, data in steps:
+                if stop.is_set():
+                    break
+                self.request(label, method, path, data)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env, port, workers, threads, log_path):
+    """Start gunicorn with the production settings, logging to ``log_path``."""
+    env = dict(env, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads))
+    with open(log_path, 'wb') as log:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', str(ROOT / 'gunicorn.conf.py'),
+             '--access-logfile', '/dev/null'],
+            env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('Server exited during startup:\n' + Path(log_path).read_text())
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return server, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('Server did not start within 30 seconds')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, seconds):
+    latencies = sorted(latency for _, latency, _ in samples)
+    errors = sum(1 for _, _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / seconds, 1) if seconds else 0.0,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+def run_stage(concurrency, args, base_url, recorder, pools, users):
+    """Log in ``concurrency`` users, let them run for the stage, return their samples."""
+    admins = max(1, round(concurrency * args.admin_share)) if args.write_ratio else 0
+    vusers = [VirtualUser(base_url, 'user0@example.com' if i < admins else users[i % len(users)],
+                          i < admins, recorder, pools, args.timeout)
+              for i in range(concurrency)]
+    for vuser in vusers:
+        vuser.login()
+    login_samples = recorder.drain()
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=vuser.run, args=(stop, args.write_ratio), daemon=True)
+               for vuser in vusers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.stage_seconds)
+    stop.set()
+    for thread in threads:
+        thread.join(args.timeout + 1)
+    elapsed = time.perf_counter() - started
+    return login_samples, recorder.drain(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pets', type=parse_size, default=parse_size('10k'))
+    parser.add_argument('--users', type=parse_size, default=200)
+    parser.add_argument('--stages', default='1,2,4,8,16,32',
+                        help='Comma-separated concurrency levels to ramp through.')
+    parser.add_argument('--stage-seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.5,
+                        help='Share of admin journeys that write; 0 disables admin users.')
+    parser.add_argument('--admin-share', type=float, default=0.1,
+                        help='Share of virtual users logged in as the admin.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker.')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                        help='Password hash method for seeded users and the server.')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds.')
+    parser.add_argument('--output', help='Write per-stage and per-step results as JSON.')
+    args = parser.parse_args()
+    stages = [int(level) for level in args.stages.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{Path(tmp) / 'load.db'}",
+                   APP_CONFIG='production', SECRET_KEY=secrets.token_hex(16),
+                   PASSWORD_HASH_METHOD=args.hash_method, IMAGE_UPLOAD_FOLDER=tmp)
+        os.environ.update(env)
+        from app import create_app, db
+
+        print(f'Seeding {args.pets} pets and {args.users} users...')
+        app = create_app()
+        app.logger.setLevel('WARNING')
+        with app.app_context():
+            seed(db, args.pets, args.users)
+            db.engine.dispose()
+
+        log_path = Path(tmp) / 'server.log'
+        server, base_url = start_server(env, free_port(), args.workers, args.threads, log_path)
+        print(f'Serving on {base_url} with {args.workers} workers x {args.threads} threads\n')
+        recorder = Recorder()
+        pools = PetPools(args.pets)
+        adopters = [f'user{i}@example.com' for i in range(1, max(args.users, 2))]
+        by_step = defaultdict(list)
+        results = []
+        print(f"{'users':>6} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'max ms':>8} {'login p95':>10}")
+        try:
+            for concurrency in stages:
+                login_samples, samples, elapsed = run_stage(
+                    concurrency, args, base_url, recorder, pools, adopters)
+                summary = summarize(samples, elapsed)
+                logins = summarize(login_samples, 0)
+                results.append({'concurrency': concurrency, **summary, 'login_p95_ms': logins['p95_ms'],
+                                'login_errors': round(logins['error_rate'] * logins['requests'])})
+                for step, latency, ok in samples:
+                    by_step[step].append((step, latency, ok))
+                print(f"{concurrency:>6} {summary['throughput_rps']:>8.1f} "
+                      f"{summary['error_rate']:>7.2%} {summary['p50_ms']:>8.1f} "
+                      f"{summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} "
+                      f"{summary['max_ms']:>8.1f} {logins['p95_ms']:>10.1f}")
+        finally:
+            server.terminate()
+            server.wait(30)
+
+    total_seconds = args.stage_seconds * len(stages)
+    steps = {step: summarize(samples, total_seconds) for step, samples in sorted(by_step.items())}
+    print(f"\n{'step':<16} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step, summary in steps.items():
+        print(f"{step:<16} {summary['requests']:>9} {summary['error_rate']:>7.2%} "
+              f"{summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'stages': results, 'steps': steps}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
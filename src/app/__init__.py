@@ -4,10 +4,13 @@ Flask application factory.
 Author(s): Purple T-Pythons Team
 """
 
-from flask import Flask
+from flask import Flask, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from sqlalchemy import select
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,17 +21,77 @@ db = SQLAlchemy(session_options={"expire_on_commit": False})
 login_manager = LoginManager()
 
 
-def create_app():
-    """Create and configure the Flask application."""
+DEFAULT_SECRET_KEY = 'dev-secret-key-change-in-production'
 
+
+def create_app(config_name=None):
+    """Create and configure the Flask application.
+
+    ``config_name`` is ``development`` (the default) or ``production``, and
+    falls back to the ``APP_CONFIG`` environment variable.
+    """
+    started = time.perf_counter()
+    config_name = config_name or os.getenv('APP_CONFIG', 'development')
+    if config_name not in ('development', 'production'):
+        raise ValueError(f"Unknown APP_CONFIG '{config_name}'")
     
     app = Flask(__name__)
     
     # Configuration
-    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config['APP_CONFIG'] = config_name
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', DEFAULT_SECRET_KEY)
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///pawfect.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['DEBUG'] = True
+    app.config['DEBUG'] = config_name == 'development'
+    if config_name == 'production' and app.config['SECRET_KEY'] == DEFAULT_SECRET_KEY:
+        raise RuntimeError('Set SECRET_KEY before running with APP_CONFIG=production')
+    app.config['PETS_PER_PAGE'] = int(os.getenv('PETS_PER_PAGE', 20))
+    app.config['ADMIN_PETS_PER_PAGE'] = int(os.getenv('ADMIN_PETS_PER_PAGE', 200))
+    app.config['API_MAX_PER_PAGE'] = int(os.getenv('API_MAX_PER_PAGE', 100))
+    app.config['MATCHES_PER_PAGE'] = int(os.getenv('MATCHES_PER_PAGE', 20))
+    app.config['LISTING_CACHE_SIZE'] = int(os.getenv('LISTING_CACHE_SIZE', 256))
+    app.config['LISTING_CACHE_TTL'] = int(os.getenv('LISTING_CACHE_TTL', 30))
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_SALT_LENGTH'] = int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 0))
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    app.config['FRAGMENT_CACHE_SIZE'] = int(os.getenv('FRAGMENT_CACHE_SIZE', 4096))
+    app.config['FRAGMENT_CACHE_TTL'] = int(os.getenv('FRAGMENT_CACHE_TTL', 3600))
+    app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    app.config['COMPRESS_ALGORITHMS'] = os.getenv('COMPRESS_ALGORITHMS', 'br,gzip').split(',')
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_BR_QUALITY'] = int(os.getenv('COMPRESS_BR_QUALITY', 4))
+    app.config['IMAGE_UPLOAD_FOLDER'] = os.getenv(
+        'IMAGE_UPLOAD_FOLDER', os.path.join(app.instance_path, 'uploads'))
+    app.config['IMAGE_VARIANT_WIDTHS'] = tuple(
+        int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(','))
+    app.config['MAX_IMAGE_BYTES'] = int(os.getenv('MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+    app.config['MAX_IMAGE_PIXELS'] = int(os.getenv('MAX_IMAGE_PIXELS', 40_000_000))
+    app.config['EVENT_POLL_INTERVAL'] = float(os.getenv('EVENT_POLL_INTERVAL', 1.0))
+    app.config['EVENT_HEARTBEAT'] = float(os.getenv('EVENT_HEARTBEAT', 15))
+    app.config['EVENT_STREAM_MAX_SECONDS'] = int(os.getenv('EVENT_STREAM_MAX_SECONDS', 300))
+    app.config['EVENT_RETRY_MS'] = int(os.getenv('EVENT_RETRY_MS', 3000))
+    app.config['EVENT_CLIENT_BUFFER'] = int(os.getenv('EVENT_CLIENT_BUFFER', 100))
+    app.config['EVENT_BATCH_SIZE'] = int(os.getenv('EVENT_BATCH_SIZE', 500))
+    app.config['EVENT_RETENTION'] = int(os.getenv('EVENT_RETENTION', 3600))
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 250))
+    app.config['SLOW_QUERY_LOG_PARAMETERS'] = (
+        os.getenv('SLOW_QUERY_LOG_PARAMETERS', 'false').lower() == 'true')
+    app.config['SQLITE_TUNING'] = os.getenv('SQLITE_TUNING', 'true').lower() == 'true'
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+    from .database import engine_options, init_engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     
     # Initialize extensions with app
     db.init_app(app)
@@ -39,17 +102,80 @@ def create_app():
     
     # Register blueprints
     from .routes import main
+    from .api import api
+    from .cache import LRUCache
+    from .schema import init_database
+    from .commands import register_commands
+    from .compression import init_compression
+    from .events import EventBroker
+    from .metrics import init_metrics
+    from .matching import MatchEngine
+    from .alerts import SavedSearchIndex
     app.register_blueprint(main)
+    app.register_blueprint(api)
+    register_commands(app)
+    init_compression(app)
+
+    # Per-process cache of adopter listing pages
+    app.extensions['listing_cache'] = LRUCache(
+        maxsize=app.config['LISTING_CACHE_SIZE'],
+        ttl=app.config['LISTING_CACHE_TTL'],
+    )
+    # Per-process cache of logged-in users' identity and role
+    app.extensions['user_cache'] = LRUCache(
+        maxsize=app.config['USER_CACHE_SIZE'],
+        ttl=app.config['USER_CACHE_TTL'],
+    )
+    # Per-process cache of rendered pet cards and admin table rows
+    app.extensions['fragment_cache'] = LRUCache(
+        maxsize=app.config['FRAGMENT_CACHE_SIZE'],
+        ttl=app.config['FRAGMENT_CACHE_TTL'],
+    )
+    # Per-process fan-out of pet events to server-sent event clients
+    app.extensions['event_broker'] = EventBroker(app)
+    # Per-process feature matrix of available pets for match ranking, built on first use
+    app.extensions['match_engine'] = MatchEngine()
+    # Per-process index of saved searches by criteria, for alerting on new pets
+    app.extensions['saved_search_index'] = SavedSearchIndex()
     
-    # Create database tables
+    # Create or upgrade database tables unless the schema is already current
     with app.app_context():
-        db.create_all()
-    
+        init_engine(app, db.engine)
+        init_metrics(app, db.engine)
+        schema_changed = init_database()
+        # Close connections opened at startup so workers forked from a
+        # preloading server start with an empty pool of their own
+        db.engine.dispose()
+
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started
+    if not app.debug:
+        app.logger.setLevel(logging.INFO)
+    app.logger.info('%s app ready in %.1f ms (schema %s)', config_name,
+                    app.config['STARTUP_SECONDS'] * 1000,
+                    'upgraded' if schema_changed else 'current')
     return app
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user by ID for Flask-Login."""
-    from .models import User
-    return User.query.get(int(user_id))
+    """Load user by ID for Flask-Login.
+
+    Identity and role are cached per process for ``USER_CACHE_TTL`` seconds,
+    so most authenticated requests need no user query. Changes made through
+    this process evict the entry at once; other workers pick them up when
+    the entry expires.
+    """
+    from .models import User, UserIdentity
+    cache = current_app.extensions['user_cache']
+    user_id = int(user_id)
+    identity = cache.get(user_id)
+    if identity is None:
+        row = db.session.execute(
+            select(User.id, User.username, User.email, User.is_admin)
+            .where(User.id == user_id)
+        ).one_or_none()
+        if row is None:
+            return None
+        identity = UserIdentity(*row)
+        cache.set(user_id, identity)
+    return identity
@@ -0,0 +1,169 @@
+"""
+Saved-search alerts.
+
+Adopters save the listing filters they care about (species, age bucket,
+gender, vaccinated, spayed/neutered). When a pet becomes available it is
+matched against every saved search through an index keyed by the exact
+criteria combination, and a notification per match is queued in the
+``notification`` outbox table in the same transaction as the pet write.
+
+A pet can only satisfy the searches whose criteria are, field by field,
+either its own value or "any", so matching looks up at most 2**5 keys and
+touches only the searches that match, however many adopters have saved
+searches. The index is held per worker, loaded in full once, and then
+kept current incrementally: when the ``saved_searches`` version counter
+moves, only searches saved or removed since the last refresh are read.
+
+Queued alerts are listed on the adopter's saved searches page and marked
+delivered when they acknowledge them with a POST, so prefetches and link
+previews of the page do not consume them.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import threading
+from datetime import datetime
+from itertools import product
+
+from flask import current_app
+from sqlalchemy import insert, or_, select, update
+
+from . import db
+from .cache import REFRESH_OVERLAP, SAVED_SEARCHES, current_version
+from .listings import AGE_BUCKETS
+from .models import Notification, Pet, SavedSearch
+
+SEARCH_COLUMNS = (SavedSearch.id, SavedSearch.user_id, SavedSearch.removed_at,
+                  SavedSearch.species, SavedSearch.age_bucket, SavedSearch.gender,
+                  SavedSearch.vaccinated, SavedSearch.spayed_neutered)
+
+
+def age_bucket(months):
+    """The ``AGE_BUCKETS`` key an age in months falls into, or None if unknown."""
+    if months is None:
+        return None
+    for key, (_, low, high) in AGE_BUCKETS.items():
+        if months >= low and (high is None or months < high):
+            return key
+    return None
+
+
+def criteria_key(species, age, gender, vaccinated, spayed_neutered):
+    """Index key of a saved search; None fields match any pet."""
+    return (species, age, gender, bool(vaccinated), bool(spayed_neutered))
+
+
+def pet_keys(pet):
+    """Every criteria key a saved search matching ``pet`` can have."""
+    return set(product(
+        (pet.species, None),
+        (age_bucket(pet.age_months), None),
+        (pet.gender, None),
+        # A search requiring a flag matches only pets that have it
+        (True, False) if pet.vaccinated else (False,),
+        (True, False) if pet.spayed_neutered else (False,),
+    ))
+
+
+class SavedSearchIndex:
+    """Saved searches grouped by criteria, updated with the searches saved or removed."""
+
+    def __init__(self):
+        self.version = None
+        self.watermark = None
+        self.searches = {}  # criteria key -> {saved search id: user id}
+        self.keys = {}  # saved search id -> criteria key
+        self._lock = threading.Lock()
+
+    def matches(self, pet):
+        """``[(saved search id, user id)]`` of the searches ``pet`` satisfies."""
+        self.refresh()
+        with self._lock:
+            return [match for key in pet_keys(pet)
+                    for match in self.searches.get(key, {}).items()]
+
+    def refresh(self):
+        """Apply searches saved or removed since the last refresh; one query when none were."""
+        version = current_version(SAVED_SEARCHES)
+        with self._lock:
+            if version == self.version:
+                return
+            # Take the new watermark before reading so concurrent changes are re-read
+            watermark = datetime.utcnow()
+            stmt = select(*SEARCH_COLUMNS)
+            if self.watermark is None:
+                stmt = stmt.where(SavedSearch.removed_at.is_(None))
+            else:
+                since = self.watermark - REFRESH_OVERLAP
+                stmt = stmt.where(or_(SavedSearch.created_at >= since,
+                                      SavedSearch.removed_at >= since))
+            for search_id, user_id, removed_at, *criteria in db.session.execute(stmt):
+                if removed_at is None:
+                    self.add(search_id, user_id, criteria_key(*criteria))
+                else:
+                    self.remove(search_id)
+            self.watermark = watermark
+            self.version = version
+
+    def add(self, search_id, user_id, key):
+        self.keys[search_id] = key
+        self.searches.setdefault(key, {})[search_id] = user_id
+
+    def remove(self, search_id):
+        key = self.keys.pop(search_id, None)
+        if key is None:
+            return
+        group = self.searches[key]
+        group.pop(search_id, None)
+        if not group:
+            del self.searches[key]
+
+
+def queue_alerts(pet, new=False):
+    """Queue a notification for each saved search the just-available ``pet`` matches.
+
+    Runs in the caller's transaction. Pass ``new=True`` for a pet inserted
+    in it, which cannot have been announced yet; otherwise searches already
+    notified about the pet, when it was available before, are skipped.
+    Returns the number of notifications queued.
+    """
+    matches = current_app.extensions['saved_search_index'].matches(pet)
+    if not matches:
+        return 0
+    if not new:
+        notified = set(db.session.execute(
+            select(Notification.saved_search_id).where(Notification.pet_id == pet.id)
+        ).scalars())
+        matches = [match for match in matches if match[0] not in notified]
+        if not matches:
+            return 0
+    now = datetime.utcnow()
+    db.session.execute(insert(Notification), [
+        {'user_id': user_id, 'saved_search_id': search_id, 'pet_id': pet.id, 'created_at': now}
+        for search_id, user_id in matches
+    ])
+    return len(matches)
+
+
+def pending_alerts(user_id):
+    """``user_id``'s queued notifications with their pets, newest first."""
+    return db.session.execute(
+        select(Notification.id, Notification.saved_search_id, Notification.created_at,
+               Pet.id.label('pet_id'), Pet.name, Pet.species, Pet.status)
+        .join(Pet, Pet.id == Notification.pet_id)
+        .where(Notification.user_id == user_id, Notification.delivered_at.is_(None))
+        .order_by(Notification.id.desc())
+    ).all()
+
+
+def acknowledge_alerts(user_id, up_to_id):
+    """Mark ``user_id``'s queued notifications up to ``up_to_id`` delivered.
+
+    Alerts queued after the page listing them was rendered stay pending.
+    """
+    db.session.execute(
+        update(Notification)
+        .where(Notification.user_id == user_id, Notification.delivered_at.is_(None),
+               Notification.id <= up_to_id)
+        .values(delivered_at=datetime.utcnow())
+    )
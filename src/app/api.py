@@ -0,0 +1,205 @@
+"""
+Versioned JSON API for pets.
+
+``/api/v1`` exposes the adopter listings, pet details and search to the
+mobile app. Listings page with the same ``after``/``before`` cursors as the
+HTML views, ``fields=name,breed`` narrows the columns selected from the
+database, and rows are serialized straight from the select without
+building ``Pet`` objects. Every response carries a weak ETag derived from
+the same cheap count/max(updated_at) query the HTML listings use, so
+polling clients get a 304 without any rows being read, and listing bodies
+are cached per process under the listings version like the HTML pages.
+
+Author(s): Purple T-Pythons Team
+"""
+
+from flask import Blueprint, current_app, request, url_for
+from flask_login import current_user
+from sqlalchemy import select
+from werkzeug.exceptions import BadRequest, HTTPException
+
+from . import db
+from .cache import LISTINGS, current_version
+from .conditional import conditional_response
+from .metrics import query_budget
+from .listings import apply_filters, listing_stats, paginate, parse_filters
+from .models import SPECIES, STATUSES, Pet
+from .search import search_pets
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Fields clients can select with ``fields=``; responses always include ``id``.
+FIELDS = {column.key: column for column in (
+    Pet.id, Pet.name, Pet.species, Pet.breed, Pet.age, Pet.age_months, Pet.gender,
+    Pet.spayed_neutered, Pet.vaccinated, Pet.description, Pet.status, Pet.image_url,
+    Pet.image_key, Pet.created_at, Pet.updated_at,
+)}
+
+
+@api.before_request
+def require_login():
+    """API clients authenticate with the same session cookie as the site."""
+    if not current_user.is_authenticated:
+        return _error(401, 'Log in to use the API.')
+
+
+@api.errorhandler(HTTPException)
+def handle_http_error(error):
+    return _error(error.code, error.description)
+
+
+def _error(status, message):
+    return current_app.response_class(current_app.json.dumps({'error': message}),
+                                      status=status, mimetype='application/json')
+
+
+@api.route('/pets')
+@query_budget(4)
+def list_pets():
+    """One page of pets, newest first, filtered like the adopter listings."""
+    base = _base_filters()
+    filters = parse_filters(request.args)
+    fields = requested_fields()
+    per_page = _page_size()
+    after, before = request.args.get('after'), request.args.get('before')
+
+    def build():
+        cache = current_app.extensions['listing_cache']
+        key = ('api', current_version(LISTINGS), tuple(sorted(base.items())),
+               tuple(sorted(filters.items())), fields, after, before, per_page)
+        body = cache.get(key)
+        if body is None:
+            stmt = apply_filters(select(*_columns(fields)).filter_by(**base), filters)
+            page = paginate(stmt, after=after, before=before, per_page=per_page)
+            body = current_app.json.dumps({
+                'data': serialize(page.items, fields),
+                'links': {
+                    'next': _page_url(after=page.next_cursor) if page.next_cursor else None,
+                    'prev': _page_url(before=page.prev_cursor) if page.prev_cursor else None,
+                },
+            })
+            cache.set(key, body)
+        return body
+
+    count, updated_at = listing_stats(**base)
+    return _conditional(f'{count}:{_iso(updated_at)}', None, build)
+
+
+@api.route('/pets/<int:pet_id>')
+@query_budget(2)
+def get_pet(pet_id):
+    """A single pet; adopters only see available pets."""
+    fields = requested_fields()
+    row = db.session.execute(
+        select(*_columns(fields), Pet.status, Pet.updated_at).where(Pet.id == pet_id)
+    ).one_or_none()
+    if row is None:
+        return _error(404, 'Pet not found.')
+    *_, status, updated_at = row
+    if status != 'available' and not current_user.is_admin:
+        return _error(404, 'Pet not found.')
+
+    def build():
+        return current_app.json.dumps({'data': serialize([row], fields)[0]})
+    return _conditional(_iso(updated_at), updated_at, build)
+
+
+@api.route('/pets/search')
+@query_budget(3)
+def search():
+    """Available pets matching ``q``, best match first, paged by ``page``."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return _error(400, 'Pass the search text as q.')
+    fields = requested_fields()
+    per_page = _page_size()
+    page_num = max(request.args.get('page', 1, type=int), 1)
+
+    def build():
+        rows, has_next = search_pets(query, page=page_num, per_page=per_page,
+                                     columns=_columns(fields))
+        return current_app.json.dumps({
+            'data': serialize(rows, fields),
+            'links': {
+                'next': _page_url(page=page_num + 1) if has_next else None,
+                'prev': _page_url(page=page_num - 1) if page_num > 1 else None,
+            },
+        })
+
+    count, updated_at = listing_stats(status='available')
+    return _conditional(f'{count}:{_iso(updated_at)}', None, build)
+
+
+def requested_fields():
+    """Field names selected by the ``fields`` argument, ``id`` first; all by default."""
+    value = request.args.get('fields', '')
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if not names:
+        return tuple(FIELDS)
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return ('id', *dict.fromkeys(name for name in names if name != 'id'))
+
+
+def _columns(fields):
+    """Columns to select for ``fields``, plus ``created_at`` for the page cursors."""
+    columns = [FIELDS[name] for name in fields]
+    if 'created_at' not in fields:
+        columns.append(Pet.created_at)
+    return columns
+
+
+def serialize(rows, fields):
+    """Turn result rows into dicts of ``fields``, which lead each row in order."""
+    return [dict(zip(fields, map(_json_value, row))) for row in rows]
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _iso(value):
+    return value.isoformat() if value else ''
+
+
+def _base_filters():
+    """Species and status restrictions; only admins may list unavailable pets."""
+    base = {'status': 'available'}
+    status = request.args.get('status')
+    if status:
+        if status not in STATUSES:
+            raise BadRequest(f"status must be one of {', '.join(STATUSES)}")
+        if status != 'available' and not current_user.is_admin:
+            raise BadRequest('Only admins can list pets that are not available.')
+        base['status'] = status
+    species = request.args.get('species')
+    if species:
+        if species.capitalize() not in SPECIES:
+            raise BadRequest(f"species must be one of {', '.join(SPECIES)}")
+        base['species'] = species.capitalize()
+    return base
+
+
+def _page_size():
+    per_page = request.args.get('limit', current_app.config['PETS_PER_PAGE'], type=int)
+    return min(max(per_page, 1), current_app.config['API_MAX_PER_PAGE'])
+
+
+def _page_url(**changes):
+    """Absolute URL of the current request with the paging arguments replaced."""
+    args = {name: value for name, value in request.args.items()
+            if name not in ('after', 'before', 'page')}
+    args.update(changes)
+    return url_for(request.endpoint, **(request.view_args or {}), **args, _external=True)
+
+
+def _conditional(validator, updated_at, build):
+    """Respond 304 if the client's validators match, else with the JSON ``build()`` returns.
+
+    Listings pass no ``updated_at``: deleting an older pet changes them
+    without moving their latest update, so only the ETag can validate them.
+    """
+    return conditional_response(
+        validator, updated_at,
+        lambda: current_app.response_class(build(), mimetype='application/json'))
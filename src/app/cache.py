@@ -0,0 +1,113 @@
+"""
+In-process caching with database-backed invalidation.
+
+Each worker process keeps a bounded LRU of recently built results with a
+time-to-live. Entries are keyed by a version counter stored in the
+``cache_version`` table; write paths bump the counter in the same
+transaction as their change, so every worker sharing the database stops
+using stale entries on its next read without any external cache service.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+from .models import CacheVersion
+
+# Version counter for anything derived from the pet listings.
+LISTINGS = 'listings'
+# Version counter for the saved searches adopters are alerted about.
+SAVED_SEARCHES = 'saved_searches'
+
+# How far before a watermark incremental readers look again: a transaction
+# stamps its rows before it commits, so a slow writer can commit an older
+# stamp, or on PostgreSQL a lower id, after newer ones were read.
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=256, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key``, or ``default`` if absent or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """Drop ``key`` from the cache if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def current_version(name):
+    """Return the stored version of ``name``, or 0 if it was never bumped."""
+    stmt = select(CacheVersion.version).where(CacheVersion.name == name)
+    return db.session.execute(stmt).scalar() or 0
+
+
+def bump_version(name):
+    """Increment the version of ``name`` in the current transaction.
+
+    Call this before committing a write that changes data cached under
+    ``name``; the bump becomes visible to other workers with the commit.
+    The first bump of a name inserts its row with an upsert, so workers
+    making it at the same time cannot collide on the primary key.
+    """
+    dialect = db.session.get_bind().dialect.name
+    upsert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(dialect)
+    if upsert is not None:
+        db.session.execute(
+            upsert(CacheVersion)
+            .values(name=name, version=1)
+            .on_conflict_do_update(index_elements=[CacheVersion.name],
+                                   set_={'version': CacheVersion.version + 1})
+        )
+        return
+    result = db.session.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(CacheVersion(name=name, version=1))
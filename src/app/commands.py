@@ -0,0 +1,58 @@
+"""
+Flask CLI commands.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .compression import precompress_folder
+from .importer import FORMATS, decode_lines, detect_format, import_pets
+
+
+@click.command('import-pets')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Input format; guessed from the file extension if omitted.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows inserted and committed per batch.')
+@with_appcontext
+def import_pets_command(path, fmt, batch_size):
+    """Import pets from a CSV or JSON Lines file."""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the file format; pass --format.')
+
+    started = time.perf_counter()
+    with open(path, 'rb') as stream:
+        result = import_pets(decode_lines(stream), fmt, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+
+    for line_num, message in result.errors:
+        click.echo(f'line {line_num}: {message}', err=True)
+    if result.error_count > len(result.errors):
+        click.echo(f'... and {result.error_count - len(result.errors)} more errors', err=True)
+    click.echo(f'Imported {result.inserted} pets in {elapsed:.2f}s '
+               f'({result.error_count} rows rejected).')
+    if result.file_error:
+        line_num, message = result.file_error
+        raise click.ClickException(f'import stopped at line {line_num}: {message}; '
+                                   'rows from there on were not imported.')
+
+
+@click.command('compress-static')
+@with_appcontext
+def compress_static_command():
+    """Precompress static assets with gzip and Brotli."""
+    count = precompress_folder(current_app.static_folder)
+    click.echo(f'Compressed {count} static file variants.')
+
+
+def register_commands(app):
+    """Add the application's CLI commands to ``app``."""
+    app.cli.add_command(import_pets_command)
+    app.cli.add_command(compress_static_command)
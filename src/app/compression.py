@@ -0,0 +1,171 @@
+"""
+Response compression and precompressed static assets.
+
+Text responses above ``COMPRESS_MIN_SIZE`` bytes are compressed with Brotli
+or gzip, whichever the client accepts and ``COMPRESS_ALGORITHMS`` prefers.
+Streamed responses are compressed chunk by chunk with a sync flush after
+each one, so they still reach the browser incrementally.
+
+Static files are compressed ahead of time by ``flask compress-static`` (or
+``python -m app.compression`` at image build time) and the static route
+serves the ``.br`` or ``.gz`` sibling of a file when the client accepts it.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import gzip
+import mimetypes
+import os
+import sys
+import zlib
+
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Static file types worth precompressing; images and fonts are already compressed.
+STATIC_EXTENSIONS = ('.css', '.js', '.html', '.svg', '.json', '.txt', '.xml', '.map')
+
+DEFAULT_MIMETYPES = ('text/html', 'text/css', 'text/csv', 'text/plain', 'application/json',
+                     'application/javascript', 'application/x-ndjson', 'image/svg+xml')
+
+
+def init_compression(app):
+    """Compress responses and serve precompressed static files for ``app``."""
+    app.after_request(compress_response)
+    if app.static_folder:
+        app.view_functions['static'] = send_precompressed_static
+
+
+def _available_encodings():
+    algorithms = current_app.config['COMPRESS_ALGORITHMS']
+    return [name for name in algorithms if name == 'gzip' or (name == 'br' and brotli)]
+
+
+def choose_encoding(accept_encodings):
+    """Pick the preferred configured encoding the client accepts, or None."""
+    for name in _available_encodings():
+        if accept_encodings[name]:
+            return name
+    return None
+
+
+def compress(data, encoding):
+    """Compress ``data`` in one go."""
+    config = current_app.config
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_QUALITY'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks, flushing after each chunk."""
+    config = current_app.config
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BR_QUALITY'])
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def compress_response(response):
+    """``after_request`` hook compressing eligible responses."""
+    config = current_app.config
+    if (not config['COMPRESS_ENABLED']
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def send_precompressed_static(filename):
+    """Static view serving a fresh ``.br``/``.gz`` variant of a file when accepted."""
+    app = current_app
+    folder = app.static_folder
+    path = safe_join(folder, filename)
+    for encoding in _available_encodings() if path else ():
+        if not request.accept_encodings[encoding]:
+            continue
+        variant = path + SUFFIXES[encoding]
+        if os.path.isfile(variant) and os.path.isfile(path) \
+                and os.path.getmtime(variant) >= os.path.getmtime(path):
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(folder, filename + SUFFIXES[encoding],
+                                           mimetype=mimetype,
+                                           max_age=app.get_send_file_max_age(filename))
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    response = app.send_static_file(filename)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def precompress_folder(folder, level=9, br_quality=11, min_size=256):
+    """Write ``.gz`` (and ``.br`` when Brotli is installed) siblings of static text files.
+
+    Returns the number of files compressed. Variants newer than their
+    source are left alone, and files smaller than ``min_size`` are skipped.
+    """
+    count = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.endswith(STATIC_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            if os.path.getsize(path) < min_size:
+                continue
+            with open(path, 'rb') as f:
+                data = None
+                for encoding, suffix in SUFFIXES.items():
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    variant = path + suffix
+                    if os.path.exists(variant) and os.path.getmtime(variant) >= os.path.getmtime(path):
+                        continue
+                    if data is None:
+                        data = f.read()
+                    compressed = (brotli.compress(data, quality=br_quality) if encoding == 'br'
+                                  else gzip.compress(data, compresslevel=level, mtime=0))
+                    with open(variant, 'wb') as out:
+                        out.write(compressed)
+                    count += 1
+    return count
+
+
+if __name__ == '__main__':
+    default_folder = os.path.join(os.path.dirname(__file__), 'static')
+    folder = sys.argv[1] if len(sys.argv) > 1 else default_folder
+    print(f'Compressed {precompress_folder(folder)} static file variants.')
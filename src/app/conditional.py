@@ -0,0 +1,46 @@
+"""
+Conditional GET for listing pages and API responses.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request
+from flask_login import current_user
+
+
+def conditional_response(validator, updated_at, build, revalidate=True):
+    """Respond 304 if the client's copy is current, else with the response ``build()`` returns.
+
+    The weak ETag covers ``validator``, the user's role and the full request
+    path, so each page, filter and field selection is validated separately.
+    ``updated_at`` becomes the Last-Modified date when given. Pass
+    ``revalidate=False`` to always build, e.g. when flashed messages must be shown.
+    """
+    role = 'admin' if current_user.is_admin else 'adopter'
+    etag = hashlib.sha1(f'{validator}:{role}:{request.full_path}'.encode()).hexdigest()
+    last_modified = updated_at.replace(microsecond=0, tzinfo=timezone.utc) if updated_at else None
+
+    if revalidate and client_is_current(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = build()
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        # Assigning None would make Werkzeug send the current time
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def client_is_current(etag, last_modified):
+    """Check the request's If-None-Match / If-Modified-Since against a response's validators."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
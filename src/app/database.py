@@ -0,0 +1,70 @@
+"""
+Database engine tuning.
+
+SQLite connections are switched to write-ahead logging with
+``synchronous=NORMAL`` as soon as they are opened, so adopters keep reading
+while an admin writes, and commits no longer wait for a full fsync. A busy
+timeout makes writers queue for the lock instead of failing at once, and
+memory-mapped I/O plus a larger page cache keep hot pages out of syscalls.
+
+Server databases (``DATABASE_URL=postgresql://...``) get a connection pool
+sized by ``DB_POOL_SIZE``/``DB_MAX_OVERFLOW`` whose connections are
+recycled after ``DB_POOL_RECYCLE`` seconds and checked before use.
+
+Author(s): Purple T-Pythons Team
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for the configured database."""
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+    }
+
+
+def sqlite_pragmas(config):
+    """Pragmas run on every new SQLite connection, in order."""
+    return (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('temp_store', 'MEMORY'),
+    )
+
+
+def init_engine(app, engine):
+    """Tune ``engine`` for ``app``'s database; call before its first connection."""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not app.config['SQLITE_TUNING'] or not is_sqlite(uri) or is_memory_sqlite(uri):
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
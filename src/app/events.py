@@ -0,0 +1,236 @@
+"""
+Live feed of pet availability changes as server-sent events.
+
+Write paths record a ``PetEvent`` row in the same transaction as the change.
+On SQLite, with its single writer, event ids become visible in order. On
+PostgreSQL a transaction holding a lower id can commit after a higher one,
+so ids the poller skips over are looked up again for ``REFRESH_OVERLAP``
+and delivered late, without an ``id:`` so clients' resume position
+does not move back. A client that is disconnected while a late event
+arrives does not get it on reconnecting. Each worker runs at most one
+poller thread, started when the first client connects and stopped when the
+last one leaves, which reads new events with a single indexed query per
+interval and fans them out to every connected client. Clients get bounded
+queues: one that falls too far behind is disconnected rather than let
+memory grow, and the browser's ``EventSource`` reconnects with
+``Last-Event-ID`` and catches up from the table. Events older than
+``EVENT_RETENTION`` are pruned by the pollers.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from . import db
+from .cache import REFRESH_OVERLAP
+from .models import PetEvent
+
+ADDED = 'added'
+STATUS = 'status'
+DELETED = 'deleted'
+
+EVENT_COLUMNS = (PetEvent.id, PetEvent.pet_id, PetEvent.kind, PetEvent.species, PetEvent.status)
+
+
+def record_pet_event(kind, pet):
+    """Add an event for ``pet`` to the current transaction; ``pet`` must have an id."""
+    db.session.add(PetEvent(pet_id=pet.id, kind=kind, species=pet.species, status=pet.status))
+
+
+def events_after(last_id, limit):
+    """Up to ``limit`` events newer than ``last_id``, oldest first."""
+    stmt = (select(*EVENT_COLUMNS)
+            .where(PetEvent.id > last_id)
+            .order_by(PetEvent.id)
+            .limit(limit))
+    return db.session.execute(stmt).all()
+
+
+def latest_event_id():
+    return db.session.execute(select(func.max(PetEvent.id))).scalar() or 0
+
+
+def format_event(event, resumable=True):
+    """Encode an event in the ``text/event-stream`` wire format.
+
+    Pass ``resumable=False`` for an event delivered after higher ids, so it
+    does not set the client's ``Last-Event-ID``.
+    """
+    data = json.dumps({'id': event.id, 'pet_id': event.pet_id, 'kind': event.kind,
+                       'species': event.species, 'status': event.status})
+    id_line = f'id: {event.id}\n' if resumable else ''
+    return f'{id_line}event: {event.kind}\ndata: {data}\n\n'
+
+
+class Subscriber:
+    """One connected client: a bounded queue of encoded events and a species filter."""
+
+    def __init__(self, species=None, maxsize=100):
+        self.species = species
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, event, late=False):
+        if self.species and event.species != self.species:
+            return
+        try:
+            self.queue.put_nowait((event.id, format_event(event, resumable=not late)))
+        except queue.Full:
+            # Drop the client; it reconnects and resumes from the table
+            self.overflowed = True
+
+
+class EventBroker:
+    """Per-process fan-out of new ``PetEvent`` rows to connected clients."""
+
+    def __init__(self, app):
+        self.app = app
+        self.subscribers = set()
+        self.last_id = None
+        self.gaps = {}  # skipped event id -> monotonic time it was first missed
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_prune = 0.0
+
+    def subscribe(self, species=None):
+        """Register a client and make sure the poller is running."""
+        subscriber = Subscriber(species, maxsize=self.app.config['EVENT_CLIENT_BUFFER'])
+        with self._lock:
+            if self.last_id is None:
+                self.last_id = latest_event_id()
+            self.subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='pet-events', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def notify(self):
+        """Poll now instead of at the next interval, e.g. after a local write."""
+        self._wake.set()
+
+    def poll(self):
+        """Read events committed since the last poll and hand them to every client."""
+        batch = self.app.config['EVENT_BATCH_SIZE']
+        if self.gaps:
+            self._deliver(self._late_events(), late=True)
+        while True:
+            events = events_after(self.last_id, batch)
+            db.session.rollback()
+            if not events:
+                break
+            self._track_gaps(events, batch)
+            self.last_id = events[-1].id
+            self._deliver(events)
+            if len(events) < batch:
+                break
+
+    def _deliver(self, events, late=False):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for event in events:
+            for subscriber in subscribers:
+                subscriber.offer(event, late)
+
+    def _track_gaps(self, events, limit):
+        """Remember ids skipped between ``last_id`` and ``events``; they may still commit."""
+        now = time.monotonic()
+        expected = self.last_id + 1
+        for event in events:
+            # A jump this wide is a sequence skipping ahead, not transactions in flight
+            if event.id - expected <= limit:
+                for missing in range(expected, event.id):
+                    self.gaps.setdefault(missing, now)
+            expected = event.id + 1
+
+    def _late_events(self):
+        """Events committed under skipped ids since the last poll; gives up on old gaps."""
+        cutoff = time.monotonic() - REFRESH_OVERLAP.total_seconds()
+        self.gaps = {event_id: missed for event_id, missed in self.gaps.items() if missed > cutoff}
+        if not self.gaps:
+            return []
+        events = db.session.execute(
+            select(*EVENT_COLUMNS).where(PetEvent.id.in_(self.gaps)).order_by(PetEvent.id)).all()
+        db.session.rollback()
+        for event in events:
+            del self.gaps[event.id]
+        return events
+
+    def prune(self):
+        """Delete events older than the retention period."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['EVENT_RETENTION'])
+        db.session.execute(delete(PetEvent).where(PetEvent.created_at < cutoff))
+        db.session.commit()
+
+    def _run(self):
+        interval = self.app.config['EVENT_POLL_INTERVAL']
+        with self.app.app_context():
+            while True:
+                with self._lock:
+                    if not self.subscribers:
+                        self._thread = None
+                        self.last_id = None
+                        self.gaps = {}
+                        return
+                try:
+                    self.poll()
+                    if time.monotonic() - self._last_prune > self.app.config['EVENT_RETENTION'] / 10:
+                        self._last_prune = time.monotonic()
+                        self.prune()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Polling pet events failed')
+                finally:
+                    db.session.remove()
+                self._wake.wait(interval)
+                self._wake.clear()
+
+
+def event_stream(broker, subscriber, last_event_id=None):
+    """Yield a client's events: the backlog after ``last_event_id``, then live ones.
+
+    Comment lines are sent when idle so proxies keep the connection open, and
+    the stream ends after ``EVENT_STREAM_MAX_SECONDS`` (or on overflow) so
+    the client reconnects and long-lived server threads are recycled.
+    """
+    config = broker.app.config
+    replayed = set()
+    try:
+        yield f"retry: {config['EVENT_RETRY_MS']}\n\n"
+        if last_event_id is not None:
+            backlog = events_after(last_event_id, config['EVENT_BATCH_SIZE'])
+            db.session.rollback()
+            for event in backlog:
+                if not subscriber.species or event.species == subscriber.species:
+                    yield format_event(event)
+                replayed.add(event.id)
+            if len(backlog) == config['EVENT_BATCH_SIZE']:
+                # Too far behind to replay; the client refetches the listing
+                yield 'event: reset\ndata: {}\n\n'
+                return
+        deadline = time.monotonic() + config['EVENT_STREAM_MAX_SECONDS']
+        while not subscriber.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event_id, message = subscriber.queue.get(
+                    timeout=min(config['EVENT_HEARTBEAT'], remaining))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            # The poller may queue events that were also in the backlog
+            if event_id not in replayed:
+                yield message
+    finally:
+        broker.unsubscribe(subscriber)
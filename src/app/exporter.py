@@ -0,0 +1,63 @@
+"""
+Streaming export of the pet catalogue as CSV or NDJSON.
+
+Rows are fetched with server-side batching (``yield_per``) and encoded one
+at a time into a generator, so the response starts immediately and memory
+use is flat however many pets there are.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from . import db
+from .models import Pet
+
+EXPORT_COLUMNS = (Pet.id, Pet.name, Pet.species, Pet.breed, Pet.age, Pet.age_months,
+                  Pet.gender, Pet.spayed_neutered, Pet.vaccinated, Pet.description,
+                  Pet.status, Pet.image_url, Pet.image_key, Pet.created_at, Pet.updated_at)
+
+FIELD_NAMES = [column.key for column in EXPORT_COLUMNS]
+
+
+def _rows(batch_size):
+    stmt = (select(*EXPORT_COLUMNS)
+            .order_by(Pet.id)
+            .execution_options(yield_per=batch_size))
+    return db.session.execute(stmt)
+
+
+def _serializable(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def iter_csv(batch_size=1000):
+    """Yield the catalogue as CSV text, a header line then one line per pet."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(FIELD_NAMES)
+    yield flush()
+    for partition in _rows(batch_size).partitions():
+        for row in partition:
+            writer.writerow([_serializable(value) for value in row])
+        yield flush()
+
+
+def iter_ndjson(batch_size=1000):
+    """Yield the catalogue as newline-delimited JSON, one object per pet."""
+    for partition in _rows(batch_size).partitions():
+        yield ''.join(
+            json.dumps(dict(zip(FIELD_NAMES, map(_serializable, row)))) + '\n'
+            for row in partition
+        )
@@ -0,0 +1,65 @@
+"""
+Fragment caching for per-pet template snippets.
+
+Pet cards and admin table rows render the same HTML for a pet until it is
+edited, so each rendered fragment is cached under the pet's id, its
+``updated_at`` timestamp and a hash of the sources of the fragment template
+and every template it includes. Editing the pet, the template or one of
+its partials (Jinja reloads changed templates when auto reload is on)
+changes the key, so entries never need explicit
+invalidation and stale ones simply age out of the LRU.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import hashlib
+
+from flask import current_app, render_template
+from jinja2 import meta
+from markupsafe import Markup
+
+
+def template_version(template):
+    """Short hash of a loaded template's source and those of the templates it includes.
+
+    The hash is kept on the template and recomputed only when Jinja hands
+    out a different object for one of the includes, i.e. after it reloaded
+    a changed partial.
+    """
+    env = current_app.jinja_env
+    cached = getattr(template, 'fragment_version', None)
+    if cached is not None:
+        version, includes = cached
+        if all(env.get_template(include.name) is include for include in includes):
+            return version
+
+    sources = []
+    includes = []
+    pending = [template.name]
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source, _, _ = env.loader.get_source(env, name)
+        sources.append(source)
+        if name != template.name:
+            includes.append(env.get_template(name))
+        # Names built at render time are None and cannot be followed
+        pending.extend(sorted(filter(None, meta.find_referenced_templates(env.parse(source)))))
+    version = hashlib.sha1('\0'.join(sources).encode()).hexdigest()[:12]
+    template.fragment_version = (version, includes)
+    return version
+
+
+def render_fragment(template_name, pet):
+    """Render ``template_name`` for ``pet``, reusing the cached HTML when the pet is unchanged."""
+    cache = current_app.extensions['fragment_cache']
+    template = current_app.jinja_env.get_template(template_name)
+    key = (template_name, template_version(template), pet.id, pet.updated_at)
+    html = cache.get(key)
+    if html is None:
+        html = Markup(render_template(template, pet=pet))
+        cache.set(key, html)
+    return html
@@ -0,0 +1,102 @@
+"""
+Pet image uploads with pre-generated, content-hashed variants.
+
+An uploaded image is decoded once at write time and saved as WebP and JPEG
+at each configured width under a name derived from the SHA-256 of its
+bytes. Listing pages then reference the variant that suits the browser via
+``srcset``, and because a file's name changes whenever its content does,
+variants are served with far-future ``immutable`` cache headers.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+DEFAULT_WIDTHS = (320, 640, 1280)
+
+
+def upload_folder():
+    """Directory holding generated image variants."""
+    return current_app.config['IMAGE_UPLOAD_FOLDER']
+
+
+def variant_widths():
+    return current_app.config.get('IMAGE_VARIANT_WIDTHS', DEFAULT_WIDTHS)
+
+
+def variant_filename(image_key, width, ext):
+    return f'{image_key}-{width}.{ext}'
+
+
+def save_pet_image(upload):
+    """Store resized variants of an uploaded image and return its content key.
+
+    Raises ValueError if the upload is too large, in bytes or in decoded
+    pixels, or is not an image.
+    Re-uploading the same bytes reuses the variants already on disk.
+    """
+    limit = current_app.config['MAX_IMAGE_BYTES']
+    data = upload.stream.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f'Images must be smaller than {limit // (1024 * 1024)} MB.')
+
+    image_key = hashlib.sha256(data).hexdigest()[:32]
+    folder = upload_folder()
+    os.makedirs(folder, exist_ok=True)
+    wanted = [(width, ext) for width in variant_widths() for ext in FORMATS
+              if not os.path.exists(os.path.join(folder, variant_filename(image_key, width, ext)))]
+    if not wanted:
+        return image_key
+
+    max_pixels = current_app.config['MAX_IMAGE_PIXELS']
+    too_many_pixels = f'Images must be at most {max_pixels // 1_000_000} megapixels.'
+    try:
+        # Opening reads only the header; check the size before decoding
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > max_pixels:
+            raise ValueError(too_many_pixels)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    except Image.DecompressionBombError as e:
+        raise ValueError(too_many_pixels) from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError('The uploaded file is not a supported image.') from e
+
+    quality = current_app.config.get('IMAGE_QUALITY', 80)
+    for width, ext in wanted:
+        variant = image
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            variant = image.resize((width, height), Image.LANCZOS)
+        path = os.path.join(folder, variant_filename(image_key, width, ext))
+        # Write a private temporary file then rename it, so concurrent readers
+        # never see a partial file and concurrent uploads never share one
+        with tempfile.NamedTemporaryFile(dir=folder, suffix='.tmp', delete=False) as tmp:
+            try:
+                variant.save(tmp, FORMATS[ext], quality=quality)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, path)
+    return image_key
+
+
+def image_srcset(image_key, ext):
+    """``srcset`` attribute value listing every width of one format."""
+    return ', '.join(
+        f"{url_for('main.media', filename=variant_filename(image_key, width, ext))} {width}w"
+        for width in variant_widths()
+    )
+
+
+def image_src(image_key, ext='jpg'):
+    """URL of the middle-sized variant, used as the ``src`` fallback."""
+    widths = variant_widths()
+    return url_for('main.media', filename=variant_filename(image_key, widths[len(widths) // 2], ext))
@@ -0,0 +1,201 @@
+"""
+Streaming bulk import of pets from CSV or JSON Lines.
+
+Records are parsed one at a time from the input stream, validated with the
+same age formatting as the add pet form, and inserted in batches with one
+``executemany`` and one commit per batch, so memory use does not grow with
+the size of the file. A file that cannot be read to the end (bad encoding
+or malformed CSV) stops the import at the offending line; rows before it
+are kept and reported as imported.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import codecs
+import csv
+import json
+from collections import namedtuple
+
+from sqlalchemy import insert
+
+from . import db
+from .cache import LISTINGS, bump_version
+from .models import GENDERS, SPECIES, STATUSES, Pet, age_to_months, format_age, parse_age
+
+FORMATS = ('csv', 'jsonl')
+AGE_UNITS = ('months', 'years')
+
+# ``file_error`` is ``(line number, message)`` when the file could not be read to the end.
+ImportResult = namedtuple('ImportResult', ['inserted', 'error_count', 'errors', 'file_error'],
+                          defaults=(None,))
+
+
+class ImportFileError(ValueError):
+    """The input cannot be read past ``line_num``; raised while iterating records."""
+
+    def __init__(self, line_num, message):
+        super().__init__(message)
+        self.line_num = line_num
+
+
+def detect_format(filename):
+    """Guess the import format from a file name, or None if unrecognised."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def decode_lines(stream):
+    """Yield the lines of a binary UTF-8 stream as text, one line at a time.
+
+    Decoding line by line pins an invalid byte sequence to its line, which
+    is raised as :class:`ImportFileError`.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for line_num, line in enumerate(stream, start=1):
+        try:
+            yield decoder.decode(line)
+        except UnicodeDecodeError as e:
+            raise ImportFileError(line_num, f'file is not UTF-8 text ({e.reason})')
+
+
+def iter_records(stream, fmt):
+    """Yield ``(line number, record dict)`` pairs from a text stream.
+
+    Lines that cannot be parsed are yielded as ``(line number, ValueError)``
+    so they are reported alongside validation errors. Raises
+    :class:`ImportFileError` if the rest of the file cannot be read.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        try:
+            for record in reader:
+                yield reader.line_num, record
+        except csv.Error as e:
+            raise ImportFileError(reader.line_num, f'malformed CSV: {e}')
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_num, ValueError(f'invalid JSON: {e.msg}')
+                continue
+            if not isinstance(record, dict):
+                yield line_num, ValueError('expected a JSON object')
+                continue
+            yield line_num, record
+    else:
+        raise ValueError(f'unsupported format: {fmt}')
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _flag(record, field):
+    value = record.get(field)
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+
+def validate_record(record):
+    """Convert one import record to a row for the pet table.
+
+    Ages are given either as ``age_value``/``age_unit`` like the add pet
+    form, or as an ``age`` string such as "3 months". Species are matched
+    case-insensitively against the add pet form's choices. Raises ValueError
+    describing the first problem found.
+    """
+    name = _text(record, 'name')
+    species = _text(record, 'species')
+    if not name or not species:
+        raise ValueError('name and species are required')
+    species = species.capitalize()
+    if species not in SPECIES:
+        raise ValueError(f'species must be one of {", ".join(SPECIES)}')
+
+    age_value = _text(record, 'age_value')
+    age_unit = _text(record, 'age_unit')
+    age_text = _text(record, 'age')
+    if not age_value and age_text:
+        age_value, age_unit = parse_age(age_text)
+    age = None
+    if age_value or age_unit or age_text:
+        if age_unit not in AGE_UNITS or not age_value or not age_value.isdigit():
+            raise ValueError('age must be a whole number of months or years')
+        age = format_age(age_value, age_unit)
+
+    gender = _text(record, 'gender')
+    if gender and gender not in GENDERS:
+        raise ValueError(f'gender must be one of {", ".join(GENDERS)}')
+    status = _text(record, 'status') or 'available'
+    if status not in STATUSES:
+        raise ValueError(f'status must be one of {", ".join(STATUSES)}')
+
+    return {
+        'name': name,
+        'species': species,
+        'breed': _text(record, 'breed'),
+        'age': age,
+        'age_months': age_to_months(age),
+        'gender': gender,
+        'spayed_neutered': _flag(record, 'spayed_neutered'),
+        'vaccinated': _flag(record, 'vaccinated'),
+        'description': _text(record, 'description'),
+        'status': status,
+        'image_url': _text(record, 'image_url'),
+    }
+
+
+def import_pets(stream, fmt, batch_size=1000, max_errors=100):
+    """Import pets from ``stream`` and return an :class:`ImportResult`.
+
+    Each batch of valid rows is inserted with a single executemany and
+    committed on its own, bumping the listing cache version with it. At most
+    ``max_errors`` row errors are kept as ``(line number, message)`` pairs;
+    ``error_count`` counts all of them. If the file cannot be read to the
+    end, the valid rows before the bad line are still imported and the
+    result's ``file_error`` says where reading stopped.
+    """
+    inserted = 0
+    error_count = 0
+    errors = []
+    file_error = None
+    records = iter_records(stream, fmt)
+    while file_error is None:
+        chunk = []
+        try:
+            for record in records:
+                chunk.append(record)
+                if len(chunk) == batch_size:
+                    break
+        except ImportFileError as e:
+            file_error = (e.line_num, str(e))
+        if not chunk:
+            break
+        rows = []
+        for line_num, record in chunk:
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                rows.append(validate_record(record))
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < max_errors:
+                    errors.append((line_num, str(e)))
+        if rows:
+            db.session.execute(insert(Pet.__table__), rows)
+            bump_version(LISTINGS)
+            db.session.commit()
+            inserted += len(rows)
+    return ImportResult(inserted, error_count, errors, file_error)
@@ -0,0 +1,273 @@
+"""
+Listing queries and keyset (cursor) pagination for pet listings.
+
+List views select only the columns their template renders and get back plain
+result rows rather than identity-mapped ``Pet`` entities. Pages are ordered
+newest first by ``(created_at, id)`` and addressed by an opaque cursor naming
+the row on the edge of the previous page, so every page is a bounded range
+scan over the composite indexes on ``Pet`` no matter how deep into the
+listing the user has scrolled.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import case, func, select, tuple_
+
+from . import db
+from .models import GENDERS, Pet
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+# Columns each list view renders; every set includes the pagination key and
+# updated_at, which keys the rendered fragment cache.
+LIST_COLUMNS = {
+    'admin': (Pet.id, Pet.name, Pet.species, Pet.breed, Pet.age, Pet.gender,
+              Pet.spayed_neutered, Pet.vaccinated, Pet.status, Pet.created_at,
+              Pet.updated_at),
+    'cards': (Pet.id, Pet.name, Pet.species, Pet.breed, Pet.age, Pet.gender,
+              Pet.spayed_neutered, Pet.vaccinated, Pet.description,
+              Pet.image_url, Pet.image_key, Pet.created_at, Pet.updated_at),
+}
+
+
+# Age filter buckets: key -> (label, minimum months, maximum months exclusive).
+AGE_BUCKETS = {
+    'under-1': ('Under 1 year', 0, 12),
+    '1-3': ('1-3 years', 12, 36),
+    '3-7': ('3-7 years', 36, 84),
+    '7-plus': ('7+ years', 84, None),
+}
+
+# Boolean attribute filters, set by passing ``<name>=1``.
+FLAG_FILTERS = ('vaccinated', 'spayed_neutered')
+
+# Query arguments a listing link carries over to the next page or filter.
+LISTING_ARGS = ('age', 'gender', *FLAG_FILTERS, 'q', 'after', 'before')
+
+
+def listing_select(view, **filters):
+    """Build a select of the ``view`` columns restricted by equality ``filters``."""
+    return select(*LIST_COLUMNS[view]).filter_by(**filters)
+
+
+def parse_filters(args):
+    """Extract the recognised attribute filters from request arguments."""
+    filters = {}
+    if args.get('age') in AGE_BUCKETS:
+        filters['age'] = args['age']
+    if args.get('gender') in GENDERS:
+        filters['gender'] = args['gender']
+    for flag in FLAG_FILTERS:
+        if args.get(flag) == '1':
+            filters[flag] = True
+    return filters
+
+
+def apply_filters(stmt, filters):
+    """Restrict ``stmt`` by the attribute filters returned from :func:`parse_filters`."""
+    if 'age' in filters:
+        _, low, high = AGE_BUCKETS[filters['age']]
+        stmt = stmt.where(Pet.age_months >= low)
+        if high is not None:
+            stmt = stmt.where(Pet.age_months < high)
+    if 'gender' in filters:
+        stmt = stmt.where(Pet.gender == filters['gender'])
+    for flag in FLAG_FILTERS:
+        if filters.get(flag):
+            stmt = stmt.where(getattr(Pet, flag).is_(True))
+    return stmt
+
+
+def _age_bucket():
+    whens = [(Pet.age_months < high, key)
+             for key, (_, _, high) in AGE_BUCKETS.items() if high is not None]
+    last_key = list(AGE_BUCKETS)[-1]
+    return case(*whens, (Pet.age_months >= AGE_BUCKETS[last_key][1], last_key), else_=None)
+
+
+def facet_counts(filters, **base):
+    """Count the pets in each filter option with one grouped query.
+
+    Pets matching ``base`` are grouped by every facet column at once and the
+    counts are folded in Python. Each facet's counts honour all active
+    filters except its own, so selecting an option never hides its siblings.
+    """
+    bucket = _age_bucket().label('age')
+    stmt = (select(Pet.gender, Pet.vaccinated, Pet.spayed_neutered, bucket, func.count())
+            .filter_by(**base)
+            .group_by(Pet.gender, Pet.vaccinated, Pet.spayed_neutered, bucket))
+
+    facets = {
+        'age': dict.fromkeys(AGE_BUCKETS, 0),
+        'gender': dict.fromkeys(GENDERS, 0),
+        **dict.fromkeys(FLAG_FILTERS, 0),
+    }
+    for gender, vaccinated, spayed_neutered, age, count in db.session.execute(stmt):
+        values = {'age': age, 'gender': gender,
+                  'vaccinated': bool(vaccinated), 'spayed_neutered': bool(spayed_neutered)}
+
+        def matches_except(facet):
+            return all(values[name] == wanted
+                       for name, wanted in filters.items() if name != facet)
+
+        if age in facets['age'] and matches_except('age'):
+            facets['age'][age] += count
+        if gender in facets['gender'] and matches_except('gender'):
+            facets['gender'][gender] += count
+        for flag in FLAG_FILTERS:
+            if values[flag] and matches_except(flag):
+                facets[flag] += count
+    return facets
+
+
+def listing_stats(**filters):
+    """Return ``(row count, latest updated_at)`` for pets matching ``filters``.
+
+    This is a single aggregate query answered from the covering
+    ``updated_at`` indexes, cheap enough to run before deciding whether a
+    listing needs to be rendered at all.
+    """
+    stmt = select(func.count(Pet.id), func.max(Pet.updated_at)).filter_by(**filters)
+    return db.session.execute(stmt).one()
+
+
+def encode_cursor(created_at, pet_id):
+    """Encode a ``(created_at, id)`` position as a URL-safe token."""
+    raw = f"{created_at.isoformat()}|{pet_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token, returning None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, pet_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pet_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _cursor_for(row):
+    return encode_cursor(row.created_at, row.id)
+
+
+def _fetch(stmt):
+    return db.session.execute(stmt).all()
+
+
+def paginate(stmt, after=None, before=None, per_page=20):
+    """Return one page of ``stmt`` positioned by the ``after``/``before`` cursors.
+
+    ``after`` moves forward (older pets) and ``before`` moves back (newer
+    pets). One extra row is fetched to tell whether another page exists in
+    the direction of travel.
+    """
+    key = tuple_(Pet.created_at, Pet.id)
+    before_pos = decode_cursor(before)
+    after_pos = None if before_pos else decode_cursor(after)
+
+    if before_pos:
+        rows = _fetch(stmt.where(key > before_pos)
+                      .order_by(Pet.created_at.asc(), Pet.id.asc())
+                      .limit(per_page + 1))
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        next_cursor = _cursor_for(rows[-1]) if rows else None
+        prev_cursor = _cursor_for(rows[0]) if has_more else None
+        return Page(rows, next_cursor, prev_cursor)
+
+    if after_pos:
+        stmt = stmt.where(key < after_pos)
+    rows = _fetch(stmt.order_by(Pet.created_at.desc(), Pet.id.desc())
+                  .limit(per_page + 1))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = _cursor_for(rows[-1]) if has_more else None
+    prev_cursor = _cursor_for(rows[0]) if after_pos and rows else None
+    return Page(rows, next_cursor, prev_cursor)
+
+
+class StreamedPage:
+    """A forward page whose rows are fetched lazily while they are iterated.
+
+    Used with streamed templates: rows come from the database in
+    ``batch_size`` chunks as the template renders them, so neither the rows
+    nor the HTML for the whole page are held in memory at once. The page
+    can be iterated once, and ``next_cursor`` is known only after that.
+    """
+
+    def __init__(self, stmt, after_pos, per_page, batch_size):
+        self._stmt = (stmt.order_by(Pet.created_at.desc(), Pet.id.desc())
+                      .limit(per_page + 1)
+                      .execution_options(yield_per=batch_size))
+        self._after_pos = after_pos
+        self._per_page = per_page
+        self._result = None
+        self._peeked = []
+        self._yielded = None
+        self.prev_cursor = None
+        self.next_cursor = None
+
+    @property
+    def items(self):
+        """The page's rows, for symmetry with :class:`Page`."""
+        return self
+
+    def _next_row(self):
+        if self._result is None:
+            self._result = db.session.execute(self._stmt)
+        if self._peeked:
+            return self._peeked.pop()
+        return next(self._result, None)
+
+    def __bool__(self):
+        if self._yielded is not None:
+            return self._yielded > 0
+        if not self._peeked:
+            row = self._next_row()
+            if row is None:
+                return False
+            self._peeked.append(row)
+        return True
+
+    def __iter__(self):
+        count = 0
+        last = None
+        try:
+            while count < self._per_page:
+                row = self._next_row()
+                if row is None:
+                    break
+                if count == 0 and self._after_pos:
+                    self.prev_cursor = _cursor_for(row)
+                count += 1
+                last = row
+                yield row
+            if last is not None and self._next_row() is not None:
+                self.next_cursor = _cursor_for(last)
+        finally:
+            self._yielded = count
+            if self._result is not None:
+                self._result.close()
+
+
+def stream_page(stmt, after=None, before=None, per_page=20, batch_size=100):
+    """Like :func:`paginate`, but forward pages fetch their rows lazily.
+
+    Backward pages are read in reverse order, so they are fetched eagerly
+    with :func:`paginate`; they are bounded by ``per_page`` all the same.
+    """
+    before_pos = decode_cursor(before)
+    if before_pos:
+        return paginate(stmt, before=before, per_page=per_page)
+    after_pos = decode_cursor(after)
+    if after_pos:
+        stmt = stmt.where(tuple_(Pet.created_at, Pet.id) < after_pos)
+    return StreamedPage(stmt, after_pos, per_page, batch_size)
@@ -0,0 +1,279 @@
+"""
+Adopter-pet match scoring.
+
+Each worker keeps the features of every available pet in NumPy column
+arrays (species, age, gender, vaccination, spay/neuter status), plus an
+inverted index from description words to rows. Ranking an adopter's best
+matches scores every candidate in one vectorized pass and picks the top
+rows with ``argpartition``, so the cost per request is a few array
+operations however many pets there are.
+
+The matrix is built once per process and then kept current incrementally:
+when the listings version changes, only pets updated since the last
+refresh are re-read, and pets deleted since then are found through the
+``deleted`` entries of the pet event table. Those are read by event id and,
+since PostgreSQL can commit a lower id after a higher one, also for
+``REFRESH_OVERLAP`` before the previous refresh. Only if events issued
+since the last refresh were pruned before the matrix saw them is it rebuilt
+from scratch; writes that record no events, such as bulk imports, are
+applied incrementally like any other.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func, or_, select, text
+
+from . import db
+from .cache import LISTINGS, REFRESH_OVERLAP, current_version
+from .events import DELETED
+from .models import GENDERS, SPECIES, Pet, PetEvent
+
+SPECIES_CODES = {species: code for code, species in enumerate(SPECIES)}
+GENDER_CODES = {gender: code for code, gender in enumerate(GENDERS)}
+
+# Points a pet earns for each preference it satisfies.
+WEIGHTS = {'age': 3.0, 'gender': 2.0, 'vaccinated': 1.0, 'spayed_neutered': 1.0, 'keyword': 2.0}
+
+# Age points fall off linearly over this many months outside the wanted range.
+AGE_FALLOFF_MONTHS = 24.0
+
+STOPWORDS = frozenset(('a', 'an', 'and', 'are', 'for', 'good', 'i', 'in', 'is', 'my', 'of',
+                       'or', 'that', 'the', 'to', 'who', 'with'))
+
+FEATURE_COLUMNS = (Pet.id, Pet.status, Pet.species, Pet.age_months, Pet.gender, Pet.vaccinated,
+                   Pet.spayed_neutered, Pet.name, Pet.breed, Pet.description, Pet.created_at,
+                   Pet.updated_at)
+
+
+def keywords(text):
+    """Lower-cased words of ``text`` worth matching on."""
+    return set(re.findall(r'\w+', (text or '').lower())) - STOPWORDS
+
+
+class FeatureMatrix:
+    """Column arrays of available pets' features, one row per pet, updated in place.
+
+    Rows freed by pets that were adopted or deleted are reused for new pets,
+    and ``active`` masks out rows that are currently free.
+    """
+
+    ARRAYS = {'ids': (np.int64, 0), 'active': (np.bool_, False), 'species': (np.int8, -1),
+              'gender': (np.int8, -1), 'age': (np.float32, np.nan),
+              'vaccinated': (np.bool_, False), 'spayed_neutered': (np.bool_, False),
+              'created': (np.float64, 0.0)}
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        for name, (dtype, fill) in self.ARRAYS.items():
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+        self.rows = {}  # pet id -> row
+        self.free = []
+        self.row_words = {}
+        self.postings = defaultdict(set)  # word -> rows of pets mentioning it
+        self._posting_arrays = {}  # word -> postings as an array, until they change
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _grow(self):
+        for name, (dtype, fill) in self.ARRAYS.items():
+            old = getattr(self, name)
+            new = np.full(len(old) * 2, fill, dtype=dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def upsert(self, pet):
+        """Add or update a pet row from ``FEATURE_COLUMNS``; unavailable pets are removed."""
+        if pet.status != 'available':
+            self.remove(pet.id)
+            return
+        row = self.rows.get(pet.id)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                if self.size == len(self.ids):
+                    self._grow()
+                row = self.size
+                self.size += 1
+            self.rows[pet.id] = row
+        self.ids[row] = pet.id
+        self.active[row] = True
+        self.species[row] = SPECIES_CODES.get(pet.species, -1)
+        self.gender[row] = GENDER_CODES.get(pet.gender, -1)
+        self.age[row] = np.nan if pet.age_months is None else pet.age_months
+        self.vaccinated[row] = bool(pet.vaccinated)
+        self.spayed_neutered[row] = bool(pet.spayed_neutered)
+        self.created[row] = pet.created_at.timestamp() if pet.created_at else 0.0
+        words = keywords(' '.join(filter(None, (pet.name, pet.breed, pet.description))))
+        old_words = self.row_words.get(row, set())
+        self._drop_words(row, old_words - words)
+        self.row_words[row] = words
+        for word in words - old_words:
+            self.postings[word].add(row)
+            self._posting_arrays.pop(word, None)
+
+    def remove(self, pet_id):
+        row = self.rows.pop(pet_id, None)
+        if row is None:
+            return
+        self.active[row] = False
+        self._drop_words(row, self.row_words.pop(row, ()))
+        self.free.append(row)
+
+    def _drop_words(self, row, words):
+        for word in words:
+            rows = self.postings[word]
+            rows.discard(row)
+            self._posting_arrays.pop(word, None)
+            if not rows:
+                del self.postings[word]
+
+    def score(self, preference):
+        """Return ``(scores, eligible, best possible score)`` over all rows."""
+        n = self.size
+        scores = np.zeros(n, dtype=np.float32)
+        eligible = self.active[:n].copy()
+        best = 0.0
+
+        if preference.species in SPECIES_CODES:
+            eligible &= self.species[:n] == SPECIES_CODES[preference.species]
+
+        low, high = preference.min_age_months, preference.max_age_months
+        if low is not None or high is not None:
+            age = self.age[:n]
+            distance = (np.maximum((low if low is not None else -np.inf) - age, 0)
+                        + np.maximum(age - (high if high is not None else np.inf), 0))
+            points = np.clip(1 - distance / AGE_FALLOFF_MONTHS, 0, 1) * WEIGHTS['age']
+            # Pets of unknown age earn no age points
+            scores += np.nan_to_num(points, nan=0.0)
+            best += WEIGHTS['age']
+
+        if preference.gender in GENDER_CODES:
+            scores += (self.gender[:n] == GENDER_CODES[preference.gender]) * WEIGHTS['gender']
+            best += WEIGHTS['gender']
+        for flag in ('vaccinated', 'spayed_neutered'):
+            if getattr(preference, flag):
+                scores += getattr(self, flag)[:n] * WEIGHTS[flag]
+                best += WEIGHTS[flag]
+
+        for word in keywords(preference.keywords):
+            rows = self._posting_array(word)
+            if rows is not None:
+                scores[rows] += WEIGHTS['keyword']
+            best += WEIGHTS['keyword']
+        return scores, eligible, best
+
+    def _posting_array(self, word):
+        rows = self._posting_arrays.get(word)
+        if rows is None and word in self.postings:
+            rows = self.postings[word]
+            rows = self._posting_arrays[word] = np.fromiter(rows, dtype=np.int64, count=len(rows))
+        return rows
+
+    def top(self, preference, limit):
+        """``[(pet id, match fraction)]`` of the best ``limit`` pets, newest first among equals."""
+        scores, eligible, best = self.score(preference)
+        candidates = np.flatnonzero(eligible)
+        if len(candidates) > limit:
+            keep = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[keep]
+        order = np.lexsort((-self.created[candidates], -scores[candidates]))
+        ranked = candidates[order]
+        matches = scores[ranked] / best if best else np.ones(len(ranked))
+        return list(zip(self.ids[ranked].tolist(), matches.tolist()))
+
+
+class MatchEngine:
+    """Per-process feature matrix of available pets, refreshed from the database on demand."""
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.matrix = None
+        self.version = None
+        self.watermark = None
+        self.last_event_id = 0
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+    def best_matches(self, preference, limit=20):
+        """``[(pet id, match fraction)]`` for ``preference``, best first."""
+        self.refresh()
+        with self._lock:
+            return self.matrix.top(preference, limit)
+
+    def refresh(self):
+        """Bring the matrix up to date; a single version query when nothing changed."""
+        version = current_version(LISTINGS)
+        with self._lock:
+            if self.matrix is not None and version == self.version:
+                return
+            latest_event_id = self._latest_event_id()
+            if self.matrix is None or self._missed_events(latest_event_id):
+                self._rebuild(latest_event_id)
+            else:
+                self._apply_changes(latest_event_id)
+            self.version = version
+
+    def _latest_event_id(self):
+        """Highest pet event id ever issued, whether or not it was pruned since.
+
+        Other databases fall back to the highest id still stored, which
+        cannot tell that events were pruned if none are left.
+        """
+        if db.engine.dialect.name == 'sqlite':
+            # The AUTOINCREMENT high-water mark survives pruning
+            seq = db.session.execute(
+                text("SELECT seq FROM sqlite_sequence WHERE name = 'pet_event'")).scalar()
+            return seq or 0
+        return db.session.execute(select(func.max(PetEvent.id))).scalar() or 0
+
+    def _missed_events(self, latest_event_id):
+        """Whether events issued since the last refresh were pruned before being read."""
+        if latest_event_id <= self.last_event_id:
+            return False
+        oldest_new = db.session.execute(
+            select(func.min(PetEvent.id)).where(PetEvent.id > self.last_event_id)).scalar()
+        return oldest_new is None or oldest_new > self.last_event_id + 1
+
+    def _rebuild(self, latest_event_id):
+        # Read the watermarks first so changes made during the load are re-applied
+        self.refreshed_at = datetime.utcnow()
+        self.last_event_id = latest_event_id
+        self.watermark = db.session.execute(select(func.max(Pet.updated_at))).scalar()
+        matrix = FeatureMatrix()
+        stmt = (select(*FEATURE_COLUMNS).where(Pet.status == 'available')
+                .execution_options(yield_per=self.batch_size))
+        for partition in db.session.execute(stmt).partitions():
+            for pet in partition:
+                matrix.upsert(pet)
+        self.matrix = matrix
+
+    def _apply_changes(self, latest_event_id):
+        # Deletions first: SQLite can reuse the id of a deleted pet for a new one,
+        # which the upserts below then restore
+        refreshed_at = datetime.utcnow()
+        deleted = db.session.execute(
+            select(PetEvent.pet_id)
+            .where(PetEvent.kind == DELETED,
+                   or_(PetEvent.id.between(self.last_event_id + 1, latest_event_id),
+                       PetEvent.created_at >= self.refreshed_at - REFRESH_OVERLAP))
+        ).scalars()
+        for pet_id in deleted:
+            self.matrix.remove(pet_id)
+        self.last_event_id = max(self.last_event_id, latest_event_id)
+        self.refreshed_at = refreshed_at
+
+        stmt = select(*FEATURE_COLUMNS)
+        if self.watermark is not None:
+            stmt = stmt.where(Pet.updated_at >= self.watermark - REFRESH_OVERLAP)
+        for pet in db.session.execute(stmt):
+            self.matrix.upsert(pet)
+            if self.watermark is None or pet.updated_at > self.watermark:
+                self.watermark = pet.updated_at
@@ -0,0 +1,285 @@
+"""
+Request, SQL, template and cache metrics in Prometheus text format.
+
+Every request records its latency (until the last byte of the body is
+sent, so streamed pages count in full), the SQL statements it ran and the
+time spent in them, counted by SQLAlchemy cursor events, and the time spent
+rendering each template. Cache hit and miss counts are read from the LRU
+caches when ``/metrics`` is scraped, so caching adds no extra bookkeeping.
+
+Views declare how many SQL statements a request may take with
+``@query_budget(n)``; a request going over budget is logged, and the test
+suite fails on it. Statements slower than ``SLOW_QUERY_MS`` are logged;
+their parameters, which can hold emails and password hashes, are only
+included when ``SLOW_QUERY_LOG_PARAMETERS`` is set.
+
+Metrics are kept per worker process in plain dicts behind a lock; each
+sample carries a ``worker`` label with the process id so series from
+different gunicorn workers stay apart. Set ``METRICS_TOKEN`` to require
+``Authorization: Bearer <token>`` on ``/metrics``.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import bisect
+import hmac
+import logging
+import os
+import threading
+import time
+
+from flask import (current_app, g, has_request_context, request, before_render_template,
+                   template_rendered)
+from sqlalchemy import event
+
+from .cache import LRUCache
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+sql_logger = logging.getLogger('app.sql')
+
+
+def query_budget(limit):
+    """Declare the most SQL statements one request to the decorated view should run."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def view_query_budget(app, endpoint):
+    """The budget declared by the view for ``endpoint``, or None."""
+    view = app.view_functions.get(endpoint)
+    return getattr(view, 'query_budget', None)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one value per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """Point-in-time value computed at scrape time."""
+
+    kind = 'gauge'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one per combination of label values."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                yield (f'{self.name}_bucket', _labels(self.labelnames, labels, [('le', le)]),
+                       cumulative)
+            yield f'{self.name}_sum', _labels(self.labelnames, labels), total
+            yield f'{self.name}_count', _labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    """The metrics of one app, rendered together for ``/metrics``."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra=()):
+        worker = ('worker', os.getpid())
+        lines = []
+        for metric in (*self.metrics, *extra):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                # Splice the worker label into the sample's label set
+                labels = (labels[:-1] + ',' if labels else '{') + f'{worker[0]}="{worker[1]}"}}'
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class AppMetrics:
+    """The metric families recorded for requests, SQL, templates and caches."""
+
+    def __init__(self):
+        self.registry = Registry()
+        add = self.registry.add
+        self.requests = add(Counter(
+            'http_requests_total', 'Requests handled.', ('endpoint', 'method', 'status')))
+        self.latency = add(Histogram(
+            'http_request_duration_seconds', 'Time from request start to last byte sent.',
+            ('endpoint', 'method')))
+        self.request_queries = add(Histogram(
+            'http_request_sql_queries', 'SQL statements executed per request.',
+            ('endpoint',), buckets=QUERY_COUNT_BUCKETS))
+        self.request_sql_time = add(Histogram(
+            'http_request_sql_seconds', 'Time spent in SQL statements per request.',
+            ('endpoint',)))
+        self.queries = add(Counter(
+            'sql_queries_total', 'SQL statements executed, in and out of requests.'))
+        self.sql_time = add(Counter(
+            'sql_query_seconds_total', 'Time spent executing SQL statements.'))
+        self.templates = add(Histogram(
+            'template_render_seconds', 'Time spent rendering each template, including includes.',
+            ('template',)))
+
+    def cache_metrics(self, app):
+        """Hit, miss and size series read from the app's LRU caches."""
+        hits = Counter('cache_hits_total', 'Lookups answered from an in-process cache.', ('cache',))
+        misses = Counter('cache_misses_total', 'Lookups that missed an in-process cache.', ('cache',))
+        entries = Gauge('cache_entries', 'Entries held in an in-process cache.', ('cache',))
+        for name, cache in app.extensions.items():
+            if isinstance(cache, LRUCache):
+                hits.inc(name, amount=cache.hits)
+                misses.inc(name, amount=cache.misses)
+                entries.inc(name, amount=len(cache))
+        return hits, misses, entries
+
+
+def init_metrics(app, engine):
+    """Instrument ``app`` and its ``engine`` and serve ``/metrics``."""
+    metrics = AppMetrics()
+    app.extensions['metrics'] = metrics
+
+    # The start time lives on the statement's execution context, which is
+    # discarded with it, so statements that fail leave nothing behind.
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        context.query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_started
+        metrics.queries.inc()
+        metrics.sql_time.inc(amount=elapsed)
+        slow_ms = app.config['SLOW_QUERY_MS']
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            # Parameters can hold emails and password hashes; opt in to logging them
+            if app.config['SLOW_QUERY_LOG_PARAMETERS']:
+                sql_logger.warning('Slow query (%.1f ms): %s; parameters: %r',
+                                   elapsed * 1000, statement, parameters)
+            else:
+                sql_logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, statement)
+        if has_request_context():
+            stats = g.get('request_metrics')
+            if stats is not None:
+                stats['queries'] += 1
+                stats['sql_seconds'] += elapsed
+
+    def start_template(sender, template, context, **extra):
+        if has_request_context():
+            g.setdefault('template_started', []).append(time.perf_counter())
+
+    def end_template(sender, template, context, **extra):
+        started = g.get('template_started') if has_request_context() else None
+        if started:
+            metrics.templates.observe(time.perf_counter() - started.pop(), template.name)
+
+    before_render_template.connect(start_template, app, weak=False)
+    template_rendered.connect(end_template, app, weak=False)
+
+    @app.before_request
+    def start_request():
+        g.request_metrics = {'started': time.perf_counter(), 'queries': 0, 'sql_seconds': 0.0}
+
+    @app.after_request
+    def record_request(response):
+        stats = g.get('request_metrics')
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        status = response.status_code
+        streamed_events = response.mimetype == 'text/event-stream'
+        budget = view_query_budget(app, endpoint)
+
+        def finished():
+            if budget is not None and stats['queries'] > budget:
+                sql_logger.warning('%s %s ran %d SQL statements, over its budget of %d',
+                                   method, endpoint, stats['queries'], budget)
+            metrics.requests.inc(endpoint, method, str(status))
+            # Event streams stay open for minutes; they would swamp the latencies
+            if not streamed_events:
+                metrics.latency.observe(time.perf_counter() - stats['started'], endpoint, method)
+                metrics.request_queries.observe(stats['queries'], endpoint)
+                metrics.request_sql_time.observe(stats['sql_seconds'], endpoint)
+
+        response.call_on_close(finished)
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def metrics_view():
+    """Prometheus scrape endpoint."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {token}'):
+            return current_app.response_class('Unauthorized\n', status=401, mimetype='text/plain')
+    metrics = current_app.extensions['metrics']
+    body = metrics.registry.render(metrics.cache_metrics(current_app))
+    response = current_app.response_class(body, content_type=CONTENT_TYPE)
+    response.cache_control.no_store = True
+    return response
@@ -4,11 +4,59 @@ Database models for the application.
 Author(s): Purple T-Pythons Team
 """
 
+from flask import current_app, has_app_context
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 from . import db
+from .security import hash_password, needs_rehash, verify_password
 from datetime import datetime
 
+# Choices shared by the forms, filters, importer and API.
+SPECIES = ('Dog', 'Cat')
+GENDERS = ('Male', 'Female')
+STATUSES = ('available', 'pending', 'adopted')
+
+
+def format_age(value, unit):
+    """Format an age form entry, e.g. (1, 'years') -> '1 year', (3, 'months') -> '3 months'."""
+    if not value or not unit:
+        return None
+    age_num = int(value)
+    if age_num == 1:
+        return f"1 {unit[:-1]}"  # Remove 's' for singular
+    return f"{age_num} {unit}"
+
+
+def parse_age(age):
+    """Split a stored age back into its form fields, e.g. '1 year' -> ('1', 'years')."""
+    # Handle old integer format (for backward compatibility)
+    if isinstance(age, int):
+        return str(age), 'years'
+    parts = age.split() if isinstance(age, str) else []
+    if len(parts) >= 2:
+        # Handle both singular and plural
+        if parts[1] in ['month', 'months']:
+            return parts[0], 'months'
+        if parts[1] in ['year', 'years']:
+            return parts[0], 'years'
+        return parts[0], ''
+    return '', ''
+
+
+def age_to_months(age):
+    """Convert a stored age string to whole months, or None if it cannot be parsed."""
+    value, unit = parse_age(age)
+    try:
+        value = int(value)
+    except ValueError:
+        return None
+    if unit == 'years':
+        return value * 12
+    if unit == 'months':
+        return value
+    return None
+
 
 class User(UserMixin, db.Model):
     """User model for authentication."""
@@ -20,28 +68,157 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if the provided password matches the hash."""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Check if the stored hash predates the configured hashing method or cost."""
+        return needs_rehash(self.password_hash)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _evict_cached_user(mapper, connection, user):
+    """Drop a changed or deleted user from this process's user cache."""
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].pop(user.id)
+
+
+class UserIdentity(UserMixin):
+    """Read-only snapshot of a user's identity and role, as loaded for Flask-Login."""
+
+    def __init__(self, id, username, email, is_admin):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
 
 
 class Pet(db.Model):
     """Pet model for adoption listings."""
+    __table_args__ = (
+        # Keyset pagination indexes: listings filter on species/status and
+        # page newest first by (created_at, id).
+        db.Index('ix_pet_species_status_created_id', 'species', 'status', 'created_at', 'id'),
+        db.Index('ix_pet_status_created_id', 'status', 'created_at', 'id'),
+        db.Index('ix_pet_created_id', 'created_at', 'id'),
+        # Conditional GET validators: count(*) and max(updated_at) per listing.
+        db.Index('ix_pet_species_status_updated', 'species', 'status', 'updated_at'),
+        db.Index('ix_pet_status_updated', 'status', 'updated_at'),
+        db.Index('ix_pet_updated', 'updated_at'),
+        # Age range filters on the adopter listings.
+        db.Index('ix_pet_species_status_age', 'species', 'status', 'age_months'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     species = db.Column(db.String(50), nullable=False)  # Dog or Cat
     breed = db.Column(db.String(100))
     age = db.Column(db.String(50))  # e.g., "1 year", "3 months"
+    age_months = db.Column(db.Integer)  # derived from age for range queries
     gender = db.Column(db.String(10))  # Male or Female
     spayed_neutered = db.Column(db.Boolean, default=False)
     vaccinated = db.Column(db.Boolean, default=False)
     description = db.Column(db.Text)
     status = db.Column(db.String(20), default='available')  # available, pending, adopted
     image_url = db.Column(db.String(255))
+    image_key = db.Column(db.String(64))  # content hash of an uploaded image
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @validates('age')
+    def _sync_age_months(self, key, age):
+        """Keep the normalized age in step with the display string."""
+        self.age_months = age_to_months(age)
+        return age
+
     def __repr__(self):
         return f'<Pet {self.name}>'
+
+
+class AdopterPreference(db.Model):
+    """What an adopter is looking for, used to rank their best matches."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    species = db.Column(db.String(50))  # Dog, Cat or None for either
+    min_age_months = db.Column(db.Integer)
+    max_age_months = db.Column(db.Integer)
+    gender = db.Column(db.String(10))  # Male, Female or None for either
+    vaccinated = db.Column(db.Boolean, default=False)  # prefer vaccinated pets
+    spayed_neutered = db.Column(db.Boolean, default=False)  # prefer spayed/neutered pets
+    keywords = db.Column(db.String(255))  # free text, e.g. "calm good with children"
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SavedSearch(db.Model):
+    """Listing filters an adopter wants to be alerted about when a matching pet is listed.
+
+    Removed searches keep their row with ``removed_at`` set, so every worker's
+    alert index can drop them without rereading all searches.
+    """
+    __table_args__ = (
+        db.Index('ix_saved_search_user', 'user_id'),
+        # Alert indexes pick up searches saved or removed since their last refresh.
+        db.Index('ix_saved_search_created', 'created_at'),
+        db.Index('ix_saved_search_removed', 'removed_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    species = db.Column(db.String(50))  # Dog, Cat or None for either
+    age_bucket = db.Column(db.String(10))  # a listings.AGE_BUCKETS key or None for any age
+    gender = db.Column(db.String(10))  # Male, Female or None for either
+    vaccinated = db.Column(db.Boolean, default=False, nullable=False)  # require vaccinated
+    spayed_neutered = db.Column(db.Boolean, default=False, nullable=False)  # require spayed/neutered
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    removed_at = db.Column(db.DateTime)
+
+
+class Notification(db.Model):
+    """Outbox entry: a newly available pet matching a saved search, until it is delivered."""
+    __table_args__ = (
+        # A pet is announced to each saved search at most once.
+        db.UniqueConstraint('saved_search_id', 'pet_id', name='uq_notification_search_pet'),
+        db.Index('ix_notification_user_delivered', 'user_id', 'delivered_at'),
+        db.Index('ix_notification_pet', 'pet_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    saved_search_id = db.Column(db.Integer, db.ForeignKey('saved_search.id'), nullable=False)
+    pet_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    delivered_at = db.Column(db.DateTime)
+
+
+class PetEvent(db.Model):
+    """A pet being added, changing status or being deleted, for the live event feed."""
+    __table_args__ = (
+        db.Index('ix_pet_event_created', 'created_at'),
+        # Never reuse ids of pruned events: clients resume from Last-Event-ID.
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    pet_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # added, status or deleted
+    species = db.Column(db.String(50))
+    status = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SchemaVersion(db.Model):
+    """Schema version last applied to this database by the startup check."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+
+class CacheVersion(db.Model):
+    """Version counter shared by all workers for invalidating cached data."""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -4,21 +4,51 @@ Application routes and views.
 Author(s): Purple T-Pythons Team
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session
+import math
+from datetime import datetime
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, session, current_app,
+                   make_response, stream_with_context, abort, send_from_directory, stream_template,
+                   get_flashed_messages)
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
 from . import db
-from .models import User, Pet
+from .models import (GENDERS, SPECIES, AdopterPreference, Notification, SavedSearch, User, Pet,
+                     format_age, parse_age)
+from .listings import (AGE_BUCKETS, LISTING_ARGS, apply_filters, facet_counts, listing_select,
+                       listing_stats, paginate, parse_filters, stream_page)
+from .cache import LISTINGS, SAVED_SEARCHES, bump_version, current_version
+from .search import search_pets
+from .importer import decode_lines, detect_format, import_pets as import_pet_records
+from .exporter import iter_csv, iter_ndjson
+from .images import image_src, image_srcset, save_pet_image, upload_folder
+from .fragments import render_fragment
+from .conditional import conditional_response
+from .metrics import query_budget
+from .events import ADDED, DELETED, STATUS, event_stream, record_pet_event
+from .alerts import acknowledge_alerts, pending_alerts, queue_alerts
 
 main = Blueprint('main', __name__)
+main.add_app_template_global(image_src)
+main.add_app_template_global(image_srcset)
+main.add_app_template_global(render_fragment)
+
+# Uploaded image variants are named by content hash, so they never change.
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Oldest age an adopter can ask for in their preferences.
+MAX_AGE_YEARS = 30
 
 
 @main.route('/')
+@query_budget(1)
 def index():
     """Home page with mission and links to dogs/cats."""
     return render_template('index.html')
 
 
 @main.route('/login', methods=['GET', 'POST'])
+@query_budget(3)
 def login():
     """User login route."""
     if request.method == 'POST':
@@ -28,6 +58,9 @@ def login():
         user = User.query.filter_by(email=email).first()
 
         if user and user.check_password(password):
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             # Clear any existing flash messages before adding success message
             flash("Logged in successfully!", "success")
@@ -45,6 +78,7 @@ def login():
 
 
 @main.route('/register', methods=['GET', 'POST'])
+@query_budget(3)
 def register():
     """User registration route."""
     if request.method == 'POST':
@@ -57,16 +91,6 @@ def register():
             flash("All fields are required.", "danger")
             return redirect(url_for('main.register'))
 
-        existing_user = User.query.filter_by(email=email).first()
-        if existing_user:
-            flash("Email already registered.", "danger")
-            return redirect(url_for('main.register'))
-        
-        existing_username = User.query.filter_by(username=username).first()
-        if existing_username:
-            flash("Username already taken. Please choose another.", "danger")
-            return redirect(url_for('main.register'))
-
         new_user = User(
             username=username,
             email=email,
@@ -74,8 +98,15 @@ def register():
         )
         new_user.set_password(password)
 
+        # The unique constraints on email and username do the duplicate
+        # check, so registration is a single insert with no race window
         db.session.add(new_user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash(_duplicate_user_message(email, username), "danger")
+            return redirect(url_for('main.register'))
 
         login_user(new_user)
         
@@ -92,8 +123,19 @@ def register():
     return render_template('register.html')
 
 
+def _duplicate_user_message(email, username):
+    """Explain which unique field a failed registration collided with."""
+    taken_emails = db.session.execute(
+        select(User.email).where(or_(User.email == email, User.username == username))
+    ).scalars().all()
+    if email in taken_emails:
+        return "Email already registered."
+    return "Username already taken. Please choose another."
+
+
 @main.route('/logout')
 @login_required
+@query_budget(1)
 def logout():
     """User logout route."""
     logout_user()
@@ -103,18 +145,26 @@ def logout():
 
 @main.route('/dashboard')
 @login_required
+@query_budget(5)
 def dashboard():
     """Dashboard showing different views for admin vs adopter."""
-    pets = Pet.query.all()
     if current_user.is_admin:
-        return render_template('admin_dashboard.html', pets=pets)
+        def render():
+            page = stream_page(
+                listing_select('admin'),
+                after=request.args.get('after'),
+                before=request.args.get('before'),
+                per_page=current_app.config['ADMIN_PETS_PER_PAGE'],
+            )
+            return _streamed_response('admin_dashboard.html', pets=page.items, page=page)
+        return _conditional_listing(render)
     else:
-        pets = Pet.query.filter_by(status='available').all()
-        return render_template('adopter_dashboard.html', pets=pets)
+        return _adopter_listing('adopter_dashboard.html')
 
 
 @main.route('/pet/add', methods=['GET', 'POST'])
 @login_required
+@query_budget(8)
 def add_pet():
     """Add a new pet (admin only)."""
     if not current_user.is_admin:
@@ -123,15 +173,13 @@ def add_pet():
     
     if request.method == 'POST':
         # Handle age formatting
-        age_value = request.form.get('age_value')
-        age_unit = request.form.get('age_unit')
-        age_formatted = None
-        if age_value and age_unit:
-            age_num = int(age_value)
-            if age_num == 1:
-                age_formatted = f"1 {age_unit[:-1]}"  # Remove 's' for singular
-            else:
-                age_formatted = f"{age_num} {age_unit}"
+        age_formatted = format_age(request.form.get('age_value'), request.form.get('age_unit'))
+
+        try:
+            image_key = _uploaded_image_key()
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.add_pet'))
         
         pet = Pet(
             name=request.form.get('name'),
@@ -142,10 +190,17 @@ def add_pet():
             spayed_neutered=request.form.get('spayed_neutered') == 'on',
             vaccinated=request.form.get('vaccinated') == 'on',
             description=request.form.get('description'),
-            image_url=request.form.get('image_url')
+            image_url=request.form.get('image_url'),
+            image_key=image_key
         )
         db.session.add(pet)
+        db.session.flush()
+        record_pet_event(ADDED, pet)
+        if pet.status == 'available':
+            queue_alerts(pet, new=True)
+        bump_version(LISTINGS)
         db.session.commit()
+        _notify_pet_events()
         flash(f'Pet {pet.name} added successfully!', 'success')
         return redirect(url_for('main.dashboard'))
     
@@ -154,6 +209,7 @@ def add_pet():
 
 @main.route('/pet/<int:pet_id>/edit', methods=['GET', 'POST'])
 @login_required
+@query_budget(10)
 def edit_pet(pet_id):
     """Edit pet details (admin only)."""
     if not current_user.is_admin:
@@ -164,16 +220,15 @@ def edit_pet(pet_id):
     
     if request.method == 'POST':
         # Handle age formatting
-        age_value = request.form.get('age_value')
-        age_unit = request.form.get('age_unit')
-        age_formatted = None
-        if age_value and age_unit:
-            age_num = int(age_value)
-            if age_num == 1:
-                age_formatted = f"1 {age_unit[:-1]}"  # Remove 's' for singular
-            else:
-                age_formatted = f"{age_num} {age_unit}"
+        age_formatted = format_age(request.form.get('age_value'), request.form.get('age_unit'))
+
+        try:
+            image_key = _uploaded_image_key()
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.edit_pet', pet_id=pet.id))
         
+        old_status = pet.status
         pet.name = request.form.get('name')
         pet.species = request.form.get('species')
         pet.breed = request.form.get('breed')
@@ -181,34 +236,29 @@ def edit_pet(pet_id):
         pet.description = request.form.get('description')
         pet.status = request.form.get('status')
         pet.image_url = request.form.get('image_url')
+        if image_key:
+            pet.image_key = image_key
+        elif request.form.get('remove_image'):
+            pet.image_key = None
+        if pet.status != old_status:
+            record_pet_event(STATUS, pet)
+            if pet.status == 'available':
+                queue_alerts(pet)
+        bump_version(LISTINGS)
         db.session.commit()
+        _notify_pet_events()
         flash(f'Pet {pet.name} updated successfully!', 'success')
         return redirect(url_for('main.dashboard'))
     
     # Parse existing age for editing
-    age_value = ''
-    age_unit = ''
-    if pet.age:
-        # Handle old integer format (for backward compatibility)
-        if isinstance(pet.age, int):
-            age_value = str(pet.age)
-            age_unit = 'years'
-        # Handle new string format
-        elif isinstance(pet.age, str):
-            parts = pet.age.split()
-            if len(parts) >= 2:
-                age_value = parts[0]
-                # Handle both singular and plural
-                if parts[1] in ['month', 'months']:
-                    age_unit = 'months'
-                elif parts[1] in ['year', 'years']:
-                    age_unit = 'years'
+    age_value, age_unit = parse_age(pet.age)
     
     return render_template('edit_pet.html', pet=pet, age_value=age_value, age_unit=age_unit)
 
 # Add delete pet route
 @main.route('/pet/<int:pet_id>/delete', methods=['POST'])
 @login_required
+@query_budget(7)
 def delete_pet(pet_id):
     """Delete a pet (admin only)."""
     if not current_user.is_admin:
@@ -218,22 +268,371 @@ def delete_pet(pet_id):
     pet = Pet.query.get_or_404(pet_id)
 
     db.session.delete(pet)
+    db.session.execute(delete(Notification).where(Notification.pet_id == pet.id))
+    record_pet_event(DELETED, pet)
+    bump_version(LISTINGS)
     db.session.commit()
+    _notify_pet_events()
 
     flash(f'Pet {pet.name} has been removed.', 'success')
     return redirect(url_for('main.dashboard'))
 
+
+@main.route('/pets/import', methods=['GET', 'POST'])
+@login_required
+# One batch of rows; each further batch of a large upload adds an insert and a version bump
+@query_budget(4)
+def import_pets():
+    """Bulk import pets from an uploaded CSV or JSON Lines file (admin only)."""
+    if not current_user.is_admin:
+        flash('Only admins can import pets.', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        fmt = request.form.get('format') or detect_format(upload.filename if upload else None)
+        if not upload or not upload.filename:
+            flash('Choose a file to import.', 'danger')
+            return redirect(url_for('main.import_pets'))
+        if fmt not in ('csv', 'jsonl'):
+            flash('Unsupported file type. Upload a .csv or .jsonl file.', 'danger')
+            return redirect(url_for('main.import_pets'))
+
+        result = import_pet_records(decode_lines(upload.stream), fmt)
+        flash(f'Imported {result.inserted} pets ({result.error_count} rows rejected).', 'success')
+        if result.file_error:
+            line_num, message = result.file_error
+            flash(f'Import stopped at line {line_num}: {message}. '
+                  'Only the rows before it were imported.', 'danger')
+
+    return render_template('import_pets.html', result=result)
+
+
+@main.route('/pets/export.<fmt>')
+@login_required
+@query_budget(2)
+def export_pets(fmt):
+    """Stream the whole pet catalogue as CSV or NDJSON (admin only)."""
+    if not current_user.is_admin:
+        flash('Only admins can export pets.', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    if fmt == 'csv':
+        rows, mimetype = iter_csv(), 'text/csv'
+    elif fmt == 'ndjson':
+        rows, mimetype = iter_ndjson(), 'application/x-ndjson'
+    else:
+        abort(404)
+
+    response = current_app.response_class(stream_with_context(rows), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=pets.{fmt}'
+    return response
+
+
 @main.route('/dogs')
 @login_required
+@query_budget(5)
 def view_dogs():
     """View all available dogs (requires login)."""
-    dogs = Pet.query.filter_by(species='Dog', status='available').all()
-    return render_template('view_pets.html', pets=dogs, species='Dogs')
+    return _adopter_listing('view_pets.html', species='Dog')
 
 
 @main.route('/cats')
 @login_required
+@query_budget(5)
 def view_cats():
     """View all available cats (requires login)."""
-    cats = Pet.query.filter_by(species='Cat', status='available').all()
-    return render_template('view_pets.html', pets=cats, species='Cats')
+    return _adopter_listing('view_pets.html', species='Cat')
+
+
+@main.route('/media/<path:filename>')
+@query_budget(1)
+def media(filename):
+    """Serve a generated pet image variant with far-future cache headers."""
+    response = send_from_directory(upload_folder(), filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@main.route('/events/pets')
+@login_required
+@query_budget(3)
+def pet_events():
+    """Server-sent events for pets being added, changing status or removed.
+
+    ``species=Dog`` or ``species=Cat`` limits the feed to one listing.
+    Reconnecting clients send ``Last-Event-ID`` and receive what they missed.
+    """
+    species = request.args.get('species', '').capitalize() or None
+    if species is not None and species not in SPECIES:
+        abort(400)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+
+    broker = current_app.extensions['event_broker']
+    subscriber = broker.subscribe(species)
+    response = current_app.response_class(
+        stream_with_context(event_stream(broker, subscriber, last_event_id)),
+        mimetype='text/event-stream',
+    )
+    response.cache_control.no_cache = True
+    # Tell nginx-style proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _notify_pet_events():
+    """Wake this worker's event poller so local clients hear about a write at once."""
+    current_app.extensions['event_broker'].notify()
+
+
+@main.route('/preferences', methods=['GET', 'POST'])
+@login_required
+@query_budget(3)
+def preferences():
+    """Let an adopter say what they are looking for."""
+    preference = db.session.get(AdopterPreference, current_user.id)
+    if request.method == 'POST':
+        try:
+            min_age_months = _age_in_months(request.form.get('min_age_years'))
+            max_age_months = _age_in_months(request.form.get('max_age_years'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.preferences'))
+        if preference is None:
+            preference = AdopterPreference(user_id=current_user.id)
+            db.session.add(preference)
+        species = request.form.get('species')
+        gender = request.form.get('gender')
+        preference.species = species if species in SPECIES else None
+        preference.gender = gender if gender in GENDERS else None
+        preference.min_age_months = min_age_months
+        preference.max_age_months = max_age_months
+        if (preference.min_age_months is not None and preference.max_age_months is not None
+                and preference.min_age_months > preference.max_age_months):
+            preference.min_age_months, preference.max_age_months = (
+                preference.max_age_months, preference.min_age_months)
+        preference.vaccinated = request.form.get('vaccinated') == 'on'
+        preference.spayed_neutered = request.form.get('spayed_neutered') == 'on'
+        preference.keywords = (request.form.get('keywords') or '').strip()[:255] or None
+        db.session.commit()
+        flash('Preferences saved.', 'success')
+        return redirect(url_for('main.matches'))
+    return render_template('preferences.html', preference=preference, species_options=SPECIES,
+                           gender_options=GENDERS, max_age_years=MAX_AGE_YEARS)
+
+
+def _age_in_months(years):
+    """Months in a whole or fractional number of years from a form, or None if blank.
+
+    Raises ValueError for ages that are not finite or above ``MAX_AGE_YEARS``.
+    """
+    try:
+        years = float(years)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(years) or years > MAX_AGE_YEARS:
+        raise ValueError(f'Ages must be between 0 and {MAX_AGE_YEARS} years.')
+    return max(round(years * 12), 0)
+
+
+@main.route('/matches')
+@login_required
+@query_budget(8)
+def matches():
+    """Available pets ranked by how well they fit the adopter's preferences."""
+    preference = db.session.get(AdopterPreference, current_user.id)
+    if preference is None:
+        flash('Tell us what you are looking for to see your best matches.', 'info')
+        return redirect(url_for('main.preferences'))
+    ranked = current_app.extensions['match_engine'].best_matches(
+        preference, limit=current_app.config['MATCHES_PER_PAGE'])
+    rows = db.session.execute(
+        listing_select('cards', status='available').where(Pet.id.in_([pet_id for pet_id, _ in ranked]))
+    ).all()
+    by_id = {row.id: row for row in rows}
+    # The matrix may be a moment behind; skip pets adopted since it was refreshed
+    pets = [(by_id[pet_id], match) for pet_id, match in ranked if pet_id in by_id]
+    return render_template('matches.html', pets=pets, preference=preference)
+
+
+@main.route('/saved-searches', methods=['GET', 'POST'])
+@login_required
+@query_budget(4)
+def saved_searches():
+    """Save a listing search to be alerted about, and list the alerts not yet acknowledged."""
+    if request.method == 'POST':
+        filters = parse_filters(request.form)
+        species = request.form.get('species')
+        db.session.add(SavedSearch(
+            user_id=current_user.id,
+            species=species if species in SPECIES else None,
+            age_bucket=filters.get('age'),
+            gender=filters.get('gender'),
+            vaccinated=filters.get('vaccinated', False),
+            spayed_neutered=filters.get('spayed_neutered', False),
+        ))
+        bump_version(SAVED_SEARCHES)
+        db.session.commit()
+        flash('Search saved. We will let you know when a matching pet is listed.', 'success')
+        return redirect(url_for('main.saved_searches'))
+
+    searches = db.session.execute(
+        select(SavedSearch)
+        .where(SavedSearch.user_id == current_user.id, SavedSearch.removed_at.is_(None))
+        .order_by(SavedSearch.id)
+    ).scalars().all()
+    alerts = pending_alerts(current_user.id)
+    return render_template('saved_searches.html', searches=searches, alerts=alerts,
+                           age_buckets=AGE_BUCKETS)
+
+
+@main.route('/saved-searches/alerts/seen', methods=['POST'])
+@login_required
+@query_budget(2)
+def acknowledge_saved_search_alerts():
+    """Mark the alerts listed on the saved searches page delivered."""
+    up_to = request.form.get('up_to', type=int)
+    if up_to is not None:
+        acknowledge_alerts(current_user.id, up_to)
+        db.session.commit()
+    return redirect(url_for('main.saved_searches'))
+
+
+@main.route('/saved-searches/<int:search_id>/delete', methods=['POST'])
+@login_required
+@query_budget(5)
+def delete_saved_search(search_id):
+    """Stop alerting about a saved search."""
+    search = db.session.get(SavedSearch, search_id)
+    if search is None or search.user_id != current_user.id or search.removed_at:
+        abort(404)
+    db.session.execute(delete(Notification).where(Notification.saved_search_id == search.id,
+                                                  Notification.delivered_at.is_(None)))
+    # Kept as a tombstone so alert indexes can drop it incrementally
+    search.removed_at = datetime.utcnow()
+    bump_version(SAVED_SEARCHES)
+    db.session.commit()
+    flash('Saved search removed.', 'success')
+    return redirect(url_for('main.saved_searches'))
+
+
+@main.route('/search')
+@login_required
+@query_budget(2)
+def search():
+    """Full-text search over available pets' names, breeds and descriptions."""
+    query = request.args.get('q', '').strip()
+    page_num = max(request.args.get('page', 1, type=int), 1)
+    pets, has_next = search_pets(query, page=page_num,
+                                 per_page=current_app.config['PETS_PER_PAGE'])
+    return render_template('search.html', pets=pets, query=query,
+                           page_num=page_num, has_next=has_next)
+
+
+def _streamed_response(template_name, **context):
+    """Stream a rendered template so the first bytes go out before the last rows are read."""
+    # Pop flashed messages now: the session cookie is written with the
+    # headers, before the template would get to them.
+    get_flashed_messages(with_categories=True)
+    chunks = stream_template(template_name, **context)
+    return current_app.response_class(_buffered(chunks), mimetype='text/html')
+
+
+def _buffered(chunks, size=8192):
+    """Join small template chunks into writes of about ``size`` characters."""
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _page_of(stmt):
+    """Paginate a listing query using the cursor arguments of the current request."""
+    return paginate(
+        stmt,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=current_app.config['PETS_PER_PAGE'],
+    )
+
+
+def _adopter_listing(template, species=None):
+    """Render a filtered, faceted page of available pets for adopters."""
+    base = {'status': 'available'}
+    if species:
+        base['species'] = species
+    filters = parse_filters(request.args)
+
+    def render():
+        page, facets = _available_page(base, filters)
+        return render_template(template, pets=page.items, page=page, facets=facets,
+                               filters=filters, age_buckets=AGE_BUCKETS,
+                               species=f'{species}s' if species else None,
+                               search_species=species)
+    return _conditional_listing(render, **base)
+
+
+def _available_page(base, filters):
+    """Page and facet counts of available pets, served from the listing cache."""
+    cache = current_app.extensions['listing_cache']
+    key = (
+        current_version(LISTINGS),
+        tuple(sorted(base.items())),
+        tuple(sorted(filters.items())),
+        request.args.get('after'),
+        request.args.get('before'),
+        current_app.config['PETS_PER_PAGE'],
+    )
+    cached = cache.get(key)
+    if cached is None:
+        page = _page_of(apply_filters(listing_select('cards', **base), filters))
+        cached = (page, facet_counts(filters, **base))
+        cache.set(key, cached)
+    return cached
+
+
+@main.app_template_global()
+def url_with_args(**changes):
+    """URL of the current page with some listing arguments replaced; None drops one.
+
+    Only ``LISTING_ARGS`` are carried over, so arguments ``url_for`` itself
+    interprets (``endpoint``, ``_anchor``, ``_external``...) are never passed on.
+    """
+    args = {name: request.args[name] for name in LISTING_ARGS if name in request.args}
+    args.update(changes)
+    args = {name: value for name, value in args.items() if value is not None}
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def _conditional_listing(render, **filters):
+    """Serve ``render()`` with validators for the listing matching ``filters``.
+
+    The ETag covers the row count and latest update of the listing, so a
+    client holding a current copy gets a 304 before any rows are loaded or
+    templates rendered. No Last-Modified is sent: deleting an older pet
+    changes the listing without moving its latest update. Responses
+    carrying flashed messages are always rendered so the messages are shown.
+    """
+    count, updated_at = listing_stats(**filters)
+    return conditional_response(
+        f"{count}:{updated_at.isoformat() if updated_at else ''}", None,
+        lambda: make_response(render()), revalidate='_flashes' not in session)
+
+
+def _uploaded_image_key():
+    """Store the image uploaded with a pet form, returning its key or None."""
+    upload = request.files.get('image')
+    if not upload or not upload.filename:
+        return None
+    return save_pet_image(upload)
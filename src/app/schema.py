@@ -0,0 +1,98 @@
+"""
+Schema creation, version check and in-place upgrades.
+
+``db.create_all()`` only creates missing tables, so columns and indexes
+added to models after a database was first created are applied here, along
+with any backfill their data needs. The version applied is recorded in the
+``schema_version`` table, so a process starting against an up-to-date
+database only has to read one row.
+
+Author(s): Purple T-Pythons Team
+"""
+
+from sqlalchemy import bindparam, delete, insert, inspect, select, update
+from sqlalchemy.exc import DBAPIError
+
+from . import db
+from .models import Pet, SavedSearch, SchemaVersion, age_to_months
+from .search import ensure_search_index
+
+# Bump whenever tables, columns, indexes or upgrade steps change.
+SCHEMA_VERSION = 5
+
+# Columns added to existing tables since the first release: (table, column, DDL type).
+_ADDED_COLUMNS = [
+    ('pet', 'age_months', 'INTEGER'),
+    ('pet', 'image_key', 'VARCHAR(64)'),
+    ('saved_search', 'removed_at', 'DATETIME'),
+]
+
+
+def stored_schema_version():
+    """Schema version recorded in the database, or None for a new or unversioned one."""
+    try:
+        with db.engine.connect() as conn:
+            return conn.execute(select(SchemaVersion.version)).scalar()
+    except DBAPIError:
+        return None
+
+
+def init_database():
+    """Create or upgrade the schema unless the database is already current.
+
+    Returns True if the schema had to be created or upgraded. A database
+    stamped with a newer version is left alone, so processes still running
+    older code during a rolling restart do not touch it.
+    """
+    stored = stored_schema_version()
+    if stored is not None and stored >= SCHEMA_VERSION:
+        return False
+    db.create_all()
+    upgrade_schema()
+    with db.engine.begin() as conn:
+        conn.execute(delete(SchemaVersion))
+        conn.execute(insert(SchemaVersion).values(id=1, version=SCHEMA_VERSION))
+    return True
+
+
+def upgrade_schema():
+    """Bring an existing database up to date with the current models."""
+    engine = db.engine
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, name, ddl_type in _ADDED_COLUMNS:
+            columns = {column['name'] for column in inspector.get_columns(table)}
+            if name not in columns:
+                conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {name} {ddl_type}')
+    for model in (Pet, SavedSearch):
+        for index in model.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+    ensure_search_index()
+    backfill_age_months()
+
+
+def backfill_age_months(batch_size=1000):
+    """Populate ``Pet.age_months`` for rows written before it existed.
+
+    Rows are walked in id order one batch at a time so memory stays flat,
+    and ``updated_at`` is left untouched since the pet itself did not change.
+    """
+    pets = Pet.__table__
+    stmt = (select(pets.c.id, pets.c.age)
+            .where(pets.c.age_months.is_(None), pets.c.age.is_not(None))
+            .order_by(pets.c.id)
+            .limit(batch_size))
+    fill = (update(pets)
+            .where(pets.c.id == bindparam('pet_id'))
+            .values(age_months=bindparam('months'), updated_at=pets.c.updated_at))
+    last_id = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(stmt.where(pets.c.id > last_id)).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            updates = [{'pet_id': pet_id, 'months': age_to_months(age)} for pet_id, age in rows]
+            updates = [row for row in updates if row['months'] is not None]
+            if updates:
+                conn.execute(fill, updates)
@@ -0,0 +1,87 @@
+"""
+Full-text pet search.
+
+On SQLite, pet names, breeds and descriptions are indexed in an FTS5
+external-content table, ``pet_fts``, kept in sync by triggers on ``pet`` so
+every insert, update and delete path (including bulk SQL) updates the index
+incrementally. Results are ranked with BM25, weighting name over breed over
+description. Other databases fall back to case-insensitive ``LIKE`` matching.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import re
+
+from sqlalchemy import DDL, column, event, func, inspect, literal_column, or_, select, table
+
+from . import db
+from .listings import LIST_COLUMNS
+from .models import Pet
+
+_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pet_fts USING fts5("
+    "name, breed, description, content='pet', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS pet_fts_ai AFTER INSERT ON pet BEGIN "
+    "INSERT INTO pet_fts(rowid, name, breed, description) "
+    "VALUES (new.id, new.name, new.breed, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS pet_fts_ad AFTER DELETE ON pet BEGIN "
+    "INSERT INTO pet_fts(pet_fts, rowid, name, breed, description) "
+    "VALUES ('delete', old.id, old.name, old.breed, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS pet_fts_au AFTER UPDATE OF name, breed, description ON pet BEGIN "
+    "INSERT INTO pet_fts(pet_fts, rowid, name, breed, description) "
+    "VALUES ('delete', old.id, old.name, old.breed, old.description); "
+    "INSERT INTO pet_fts(rowid, name, breed, description) "
+    "VALUES (new.id, new.name, new.breed, new.description); END",
+]
+
+for _statement in _FTS_DDL:
+    event.listen(Pet.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(Pet.__table__, 'before_drop',
+             DDL("DROP TABLE IF EXISTS pet_fts").execute_if(dialect='sqlite'))
+
+_pet_fts = table('pet_fts', column('rowid'))
+
+# BM25 column weights for name, breed and description.
+_RANK = func.bm25(literal_column('pet_fts'), 10.0, 5.0, 1.0)
+
+
+def ensure_search_index():
+    """Create and populate the FTS index for a database that predates it."""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite' or inspect(engine).has_table('pet_fts'):
+        return
+    with engine.begin() as conn:
+        for statement in _FTS_DDL:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql("INSERT INTO pet_fts(pet_fts) VALUES ('rebuild')")
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query requiring every word as a prefix.
+
+    Quoting each word keeps user input from being parsed as FTS5 operators.
+    """
+    words = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_pets(text, page=1, per_page=20, columns=LIST_COLUMNS['cards']):
+    """Return ``(rows, has_next)`` for one page of available pets matching ``text``."""
+    if not match_expression(text):
+        return [], False
+
+    stmt = select(*columns).where(Pet.status == 'available')
+    if db.engine.dialect.name == 'sqlite':
+        stmt = (stmt.join(_pet_fts, _pet_fts.c.rowid == Pet.id)
+                .where(literal_column('pet_fts').op('MATCH')(match_expression(text)))
+                .order_by(_RANK))
+    else:
+        for word in re.findall(r'\w+', text):
+            pattern = f'%{word}%'
+            stmt = stmt.where(or_(Pet.name.ilike(pattern), Pet.breed.ilike(pattern),
+                                  Pet.description.ilike(pattern)))
+        stmt = stmt.order_by(Pet.created_at.desc(), Pet.id.desc())
+
+    rows = db.session.execute(stmt.limit(per_page + 1).offset((page - 1) * per_page)).all()
+    return rows[:per_page], len(rows) > per_page
@@ -0,0 +1,81 @@
+"""
+Password hashing with a configurable method and cost.
+
+``PASSWORD_HASH_METHOD`` takes any Werkzeug method string, e.g. ``scrypt``,
+``scrypt:16384:8:1`` or ``pbkdf2:sha256:600000``. Hashes made with other
+parameters or another ``PASSWORD_SALT_LENGTH`` still verify, and
+:func:`needs_rehash` tells the login route to upgrade them. With
+``PASSWORD_HASH_WORKERS`` set, hashing runs on a bounded thread pool:
+``hashlib`` releases the GIL while hashing, so a threaded worker keeps
+serving other requests while at most that many hashes use the CPU.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+DEFAULT_SALT_LENGTH = 16
+
+_executor_lock = threading.Lock()
+
+
+def _settings():
+    if not has_app_context():
+        return DEFAULT_METHOD, DEFAULT_SALT_LENGTH, None
+    config = current_app.config
+    return (config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+            config.get('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH),
+            _executor())
+
+
+def _executor():
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS', 0)
+    if not workers:
+        return None
+    executor = current_app.extensions.get('password_hasher')
+    if executor is None:
+        with _executor_lock:
+            # Concurrent first logins must share one pool
+            executor = current_app.extensions.get('password_hasher')
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+                current_app.extensions['password_hasher'] = executor
+    return executor
+
+
+def _run(executor, func, *args):
+    if executor is None:
+        return func(*args)
+    return executor.submit(func, *args).result()
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    """Fully-parameterized form of ``method`` as it appears in stored hashes."""
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
+def hash_password(password):
+    """Hash ``password`` with the configured method and salt length."""
+    method, salt_length, executor = _settings()
+    return _run(executor, generate_password_hash, password, method, salt_length)
+
+
+def verify_password(password_hash, password):
+    """Check ``password`` against a stored hash of any supported method."""
+    _, _, executor = _settings()
+    return _run(executor, check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Whether a stored hash differs from the configured method, cost or salt length."""
+    method, salt_length, _ = _settings()
+    stored_method, _, rest = password_hash.partition('$')
+    salt = rest.partition('$')[0]
+    return stored_method != _method_prefix(method) or len(salt) != salt_length
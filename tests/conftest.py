@@ -0,0 +1,85 @@
+"""
+Shared fixtures enforcing SQL query budgets and catching N+1 patterns.
+
+Every request a test sends through the Flask test client has its SQL
+statements recorded. When the test finishes, any request that ran more
+statements than its view's ``@query_budget``, or ran the same statement
+``N_PLUS_ONE_REPEATS`` times or more, fails the test with the offending
+statements listed.
+
+Author(s): Purple T-Pythons Team
+"""
+
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from flask import has_request_context, request, request_started
+from sqlalchemy import event
+
+from app import db
+from app.metrics import view_query_budget
+
+# One statement run this many times within a request is an N+1 pattern.
+N_PLUS_ONE_REPEATS = 3
+
+
+class QueryLog:
+    """SQL statements run by each request a test makes."""
+
+    def __init__(self):
+        self.requests = []
+
+    def start_request(self, sender, **extra):
+        request.environ['tests.query_log'] = statements = []
+        self.requests.append((request.method, request.endpoint, request.full_path, statements))
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            statements = request.environ.get('tests.query_log')
+            if statements is not None:
+                statements.append(statement)
+
+    def statements(self, endpoint):
+        """Statement lists of every request to ``endpoint``, in order."""
+        return [statements for _, name, _, statements in self.requests if name == endpoint]
+
+    def problems(self, app):
+        """Describe requests over their query budget or repeating a statement."""
+        found = []
+        for method, endpoint, path, statements in self.requests:
+            budget = view_query_budget(app, endpoint)
+            if budget is not None and len(statements) > budget:
+                found.append(f'{method} {path} ran {len(statements)} SQL statements, '
+                             f'over its budget of {budget}:\n  ' + '\n  '.join(statements))
+            for statement, count in Counter(statements).items():
+                if count >= N_PLUS_ONE_REPEATS:
+                    found.append(f'{method} {path} ran this statement {count} times '
+                                 f'(N+1 query?):\n  {statement}')
+        return found
+
+
+@pytest.fixture(autouse=True)
+def query_log(request):
+    """Record SQL per request for tests using the ``app`` fixture and check the budgets."""
+    if 'app' not in request.fixturenames:
+        yield None
+        return
+    app = request.getfixturevalue('app')
+    log = QueryLog()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', log.record)
+    request_started.connect(log.start_request, app)
+    try:
+        yield log
+    finally:
+        request_started.disconnect(log.start_request, app)
+        event.remove(engine, 'before_cursor_execute', log.record)
+    problems = log.problems(app)
+    if problems:
+        pytest.fail('\n\n'.join(problems), pytrace=False)
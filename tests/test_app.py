@@ -143,3 +143,990 @@ def test_dashboard_lists_pets(app, client, admin_user):
 
     response = client.get("/dashboard")
     assert b"Buddy" in response.data
+
+
+# Test 6 — Listings are keyset-paginated newest first
+
+def test_view_dogs_paginates_with_cursors(app, client, admin_user):
+    from datetime import datetime, timedelta
+    from app.listings import decode_cursor
+
+    app.config['PETS_PER_PAGE'] = 2
+    with app.app_context():
+        start = datetime(2024, 1, 1)
+        for i in range(5):
+            db.session.add(Pet(name=f"Dog{i}", species="Dog", status="available",
+                               created_at=start + timedelta(days=i)))
+        db.session.add(Pet(name="CatX", species="Cat", status="available", created_at=start))
+        db.session.commit()
+
+    force_login(client, admin_user)
+
+    first = client.get("/dogs")
+    assert b"Dog4" in first.data and b"Dog3" in first.data
+    assert b"Dog2" not in first.data and b"CatX" not in first.data
+    assert b"Newer" not in first.data
+
+    from app.listings import listing_select, paginate
+    with app.test_request_context():
+        query = listing_select("cards", species="Dog", status="available")
+        page1 = paginate(query, per_page=2)
+        page2 = paginate(query, after=page1.next_cursor, per_page=2)
+        page3 = paginate(query, after=page2.next_cursor, per_page=2)
+        back = paginate(query, before=page2.prev_cursor, per_page=2)
+
+    assert [p.name for p in page2.items] == ["Dog2", "Dog1"]
+    assert [p.name for p in page3.items] == ["Dog0"]
+    assert page3.next_cursor is None
+    assert [p.name for p in back.items] == ["Dog4", "Dog3"]
+    assert back.prev_cursor is None
+
+    second = client.get(f"/dogs?after={page1.next_cursor}")
+    assert b"Dog2" in second.data and b"Dog4" not in second.data
+    assert b"Newer" in second.data and b"Older" in second.data
+    assert decode_cursor("not-a-cursor") is None
+
+
+# Test 7 — List views select plain rows, not Pet entities
+
+def test_listing_select_returns_projected_rows(app):
+    from app.listings import listing_select, paginate
+
+    with app.app_context():
+        db.session.add(Pet(name="Nala", species="Cat", status="available", description="x" * 500))
+        db.session.commit()
+        db.session.expunge_all()
+
+        page = paginate(listing_select("admin"))
+        row = page.items[0]
+        assert not isinstance(row, Pet)
+        assert row.name == "Nala"
+        assert "description" not in row._fields
+        assert len(db.session.identity_map) == 0
+
+
+# Test 8 — Adopter listings are cached until an admin write bumps the version
+
+def test_listing_cache_invalidated_by_writes(app, client, admin_user):
+    with app.app_context():
+        db.session.add(Pet(name="Rusty", species="Dog", status="available"))
+        db.session.commit()
+
+    cache = app.extensions['listing_cache']
+    force_login(client, admin_user)
+
+    assert b"Rusty" in client.get("/dogs").data
+    assert b"Rusty" in client.get("/dogs").data
+    assert cache.hits == 1
+
+    client.post("/pet/add", data={"name": "Pepper", "species": "Dog"})
+    assert b"Pepper" in client.get("/dogs").data
+    assert cache.hits == 1
+
+    from app.cache import bump_version, current_version
+    with app.app_context():
+        # The first bump of a name creates its row; later ones increment it
+        bump_version("tests")
+        bump_version("tests")
+        db.session.commit()
+        assert current_version("tests") == 2
+
+
+def test_lru_cache_evicts_and_expires():
+    from app.cache import LRUCache
+
+    now = [0.0]
+    cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    now[0] = 11
+    assert cache.get("c") is None
+
+
+# Test 9 — Listings answer conditional GETs with 304 until the data changes
+
+def test_listing_conditional_get(app, client, admin_user):
+    with app.app_context():
+        db.session.add(Pet(name="Scout", species="Dog", status="available"))
+        db.session.commit()
+
+    force_login(client, admin_user)
+
+    first = client.get("/dogs")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert "Last-Modified" not in first.headers
+
+    cached = client.get("/dogs", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+
+    assert client.get("/cats", headers={"If-None-Match": etag}).status_code == 200
+
+    client.post("/pet/add", data={"name": "Ranger", "species": "Dog"})
+    client.get("/dashboard")  # consume the flashed message
+    changed = client.get("/dogs", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert b"Ranger" in changed.data
+
+    # Deleting an older pet leaves the newest update alone; If-Modified-Since
+    # on its own must not get a 304 for a listing that changed
+    with app.app_context():
+        scout = Pet.query.filter_by(name="Scout").one().id
+    client.post(f"/pet/{scout}/delete")
+    client.get("/dashboard")
+    after_delete = client.get("/dogs", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert after_delete.status_code == 200
+    assert b"Scout" not in after_delete.data
+
+
+# Test 10 — Full-text search is ranked and follows add/edit/delete
+
+def test_search_ranks_and_tracks_writes(app, client, admin_user):
+    from app.search import search_pets
+
+    with app.app_context():
+        db.session.add_all([
+            Pet(name="Biscuit", species="Dog", breed="Beagle", status="available",
+                description="Loves long walks"),
+            Pet(name="Walker", species="Dog", breed="Terrier", status="available"),
+            Pet(name="Ghost", species="Cat", status="adopted", description="walks at night"),
+        ])
+        db.session.commit()
+        biscuit_id = Pet.query.filter_by(name="Biscuit").first().id
+        walker_id = Pet.query.filter_by(name="Walker").first().id
+
+    with app.test_request_context():
+        rows, has_next = search_pets("walk")
+        assert [r.name for r in rows] == ["Walker", "Biscuit"]
+        assert not has_next
+        assert search_pets('") OR name:*')[0] == []
+
+    force_login(client, admin_user)
+    client.post(f"/pet/{biscuit_id}/edit", data={
+        "name": "Biscuit", "species": "Dog", "breed": "Poodle",
+        "description": "Sleepy", "status": "available",
+    })
+    client.post(f"/pet/{walker_id}/delete")
+
+    assert b"Biscuit" in client.get("/search?q=poodle").data
+    response = client.get("/search?q=walk")
+    assert b"Walker" not in response.data and b"Biscuit" not in response.data
+
+
+# Test 11 — Ages are normalized to months and drive filters and facets
+
+def test_age_months_filters_and_facets(app, client, admin_user):
+    from app.listings import facet_counts
+
+    with app.app_context():
+        db.session.add_all([
+            Pet(name="Pup", species="Dog", status="available", age="6 months",
+                gender="Male", vaccinated=True),
+            Pet(name="Elder", species="Dog", status="available", age="9 years",
+                gender="Female", vaccinated=True, spayed_neutered=True),
+            Pet(name="Middle", species="Dog", status="available", age="2 years",
+                gender="Female"),
+        ])
+        db.session.commit()
+        assert Pet.query.filter_by(name="Elder").first().age_months == 108
+
+        facets = facet_counts({'gender': 'Female'}, species="Dog", status="available")
+        assert facets['gender'] == {'Male': 1, 'Female': 2}
+        assert facets['age'] == {'under-1': 0, '1-3': 1, '3-7': 0, '7-plus': 1}
+        assert facets['vaccinated'] == 1
+
+    force_login(client, admin_user)
+    response = client.get("/dogs?age=under-1")
+    assert b"Pup" in response.data and b"Elder" not in response.data
+
+    response = client.get("/dogs?gender=Female&vaccinated=1")
+    assert b"Elder" in response.data
+    assert b"Middle" not in response.data and b"Pup" not in response.data
+
+
+def test_filter_links_ignore_url_for_arguments(app, client, admin_user):
+    with app.app_context():
+        db.session.add(Pet(name="Rex", species="Dog", status="available", age="2 years",
+                           gender="Male"))
+        db.session.commit()
+
+    force_login(client, admin_user)
+    response = client.get("/dogs?endpoint=x&_anchor=zz&_external=1&gender=Male")
+    assert response.status_code == 200
+    assert b"#zz" not in response.data and b"http://" not in response.data
+    assert b'href="/dogs?gender=Male&amp;age=1-3"' in response.data
+
+
+def test_backfill_age_months(app):
+    from app.schema import backfill_age_months
+
+    with app.app_context():
+        pet = Pet(name="Old", species="Cat", age="3 years")
+        db.session.add(pet)
+        db.session.commit()
+        db.session.execute(db.update(Pet).values(age_months=None))
+        db.session.commit()
+
+        backfill_age_months(batch_size=1)
+        assert db.session.execute(db.select(Pet.age_months)).scalar() == 36
+
+
+# Test 12 — Bulk import from CSV upload and JSONL via the CLI
+
+def test_import_pets_csv_upload(app, client, admin_user):
+    import io
+
+    csv_data = (
+        "name,species,breed,age_value,age_unit,gender,vaccinated\n"
+        "Bolt,Dog,Collie,1,years,Male,yes\n"
+        ",Cat,,,,,\n"
+        "Tiny,Cat,,4,weeks,Female,\n"
+        "Mochi,cat,Siamese,5,months,Female,no\n"
+        "Tweety,Bird,,,,,\n"
+    )
+    force_login(client, admin_user)
+    response = client.post("/pets/import", data={
+        "file": (io.BytesIO(csv_data.encode()), "pets.csv"),
+    }, content_type="multipart/form-data")
+
+    assert response.status_code == 200
+    assert b"Imported 2 pets (3 rows rejected)" in response.data
+    assert b"name and species are required" in response.data
+    assert b"species must be one of Dog, Cat" in response.data
+    with app.app_context():
+        assert Pet.query.filter_by(name="Mochi").first().species == "Cat"
+        bolt = Pet.query.filter_by(name="Bolt").first()
+        assert bolt.age == "1 year" and bolt.age_months == 12
+        assert bolt.vaccinated and bolt.status == "available"
+
+
+def test_import_pets_reports_unreadable_files(app, client, admin_user):
+    import io
+
+    csv_data = (
+        "name,species,age\n"
+        "Bolt,Dog,2 years\n"
+        "Gramps,Dog,old\n"
+        "Zo\u00e9,Cat,1 year\n"
+        "Late,Cat,\n"
+    ).encode("latin-1")
+    force_login(client, admin_user)
+    response = client.post("/pets/import", data={
+        "file": (io.BytesIO(csv_data), "pets.csv"),
+    }, content_type="multipart/form-data")
+
+    assert response.status_code == 200
+    assert b"Imported 1 pets (1 rows rejected)" in response.data
+    assert b"age must be a whole number" in response.data
+    assert b"Import stopped at line 4: file is not UTF-8 text" in response.data
+    with app.app_context():
+        assert [pet.name for pet in Pet.query.all()] == ["Bolt"]
+
+
+def test_import_pets_cli_jsonl(app, tmp_path):
+    path = tmp_path / "pets.jsonl"
+    path.write_text(
+        '{"name": "Olive", "species": "Dog", "age": "3 months"}\n'
+        'not json\n'
+        '{"name": "Pip", "species": "Cat", "status": "pending"}\n'
+    )
+    result = app.test_cli_runner().invoke(args=["import-pets", str(path), "--batch-size", "1"])
+
+    assert "Imported 2 pets" in result.output
+    assert "line 2: invalid JSON" in result.output
+    with app.app_context():
+        assert Pet.query.filter_by(name="Olive").first().age_months == 3
+
+
+# Test 13 — Catalogue export streams CSV and NDJSON
+
+def test_export_pets_streams_csv_and_ndjson(app, client, admin_user):
+    import csv
+    import io
+    import json
+
+    with app.app_context():
+        db.session.add_all([Pet(name=f"Pet{i}", species="Dog", age="2 years") for i in range(5)])
+        db.session.commit()
+
+    force_login(client, admin_user)
+
+    response = client.get("/pets/export.csv")
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["name"] for row in rows] == [f"Pet{i}" for i in range(5)]
+    assert rows[0]["age_months"] == "24"
+
+    response = client.get("/pets/export.ndjson")
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(records) == 5 and records[0]["species"] == "Dog"
+
+    assert client.get("/pets/export.xml").status_code == 404
+
+
+# Test 14 — Login upgrades hashes made with an older method or cost
+
+def test_login_rehashes_outdated_password_hash(app, client):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    with app.app_context():
+        user = User(username="old", email="old@example.com")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.commit()
+        assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+        assert not user.password_needs_rehash()
+
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    app.config['PASSWORD_HASH_WORKERS'] = 2
+    client.post("/login", data={"email": "old@example.com", "password": "secret"})
+
+    with app.app_context():
+        user = User.query.filter_by(email="old@example.com").first()
+        assert user.password_hash.startswith("pbkdf2:sha256:2000$")
+        assert user.check_password("secret")
+        assert not user.check_password("wrong")
+
+    app.config['PASSWORD_SALT_LENGTH'] = 24
+    with app.app_context():
+        assert user.password_needs_rehash()
+    client.post("/login", data={"email": "old@example.com", "password": "secret"})
+    with app.app_context():
+        user = User.query.filter_by(email="old@example.com").first()
+        assert len(user.password_hash.split("$")[1]) == 24
+        assert not user.password_needs_rehash()
+
+
+def test_password_hash_pool_is_created_once(app):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.security import _executor
+
+    app.config['PASSWORD_HASH_WORKERS'] = 2
+
+    def first_login(_):
+        with app.app_context():
+            return _executor()
+
+    with ThreadPoolExecutor(max_workers=8) as logins:
+        executors = set(logins.map(first_login, range(8)))
+    assert executors == {app.extensions['password_hasher']}
+
+
+# Test 15 — Logged-in users are loaded from the per-process user cache
+
+def test_load_user_is_cached_and_evicted_on_change(app, admin_user):
+    from app import load_user
+
+    cache = app.extensions['user_cache']
+    with app.app_context():
+        first = load_user(str(admin_user.id))
+        second = load_user(str(admin_user.id))
+        assert first is second and first.is_admin
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        user = db.session.get(User, admin_user.id)
+        user.is_admin = False
+        db.session.commit()
+
+        assert not load_user(str(admin_user.id)).is_admin
+        assert load_user("9999") is None
+
+
+# Test 16 — Duplicate registrations are caught by the unique constraints
+
+def test_register_duplicate_email_and_username(app, client, admin_user):
+    def register(username, email):
+        response = client.post("/register", data={
+            "username": username, "email": email,
+            "password": "pw", "role": "adopter",
+        })
+        with client.session_transaction() as sess:
+            messages = [message for _, message in sess.pop("_flashes", [])]
+        return response, messages
+
+    response, messages = register("someone", "admin@example.com")
+    assert response.location.endswith("/register")
+    assert messages == ["Email already registered."]
+
+    _, messages = register("admin", "new@example.com")
+    assert messages == ["Username already taken. Please choose another."]
+
+    response, messages = register("newbie", "new@example.com")
+    assert messages == ["Account created successfully!"]
+    assert response.location.endswith("/dashboard")
+    with app.app_context():
+        assert User.query.count() == 2
+
+
+# Test 17 — Uploaded images become content-hashed, resized variants
+
+def test_add_pet_image_upload_generates_variants(app, client, admin_user, tmp_path):
+    import io
+    from PIL import Image
+
+    app.config['IMAGE_UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['IMAGE_VARIANT_WIDTHS'] = (100, 200)
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), "orange").save(buffer, "PNG")
+
+    force_login(client, admin_user)
+    client.post("/pet/add", data={
+        "name": "Sunny", "species": "Dog",
+        "image": (io.BytesIO(buffer.getvalue()), "sunny.png"),
+    }, content_type="multipart/form-data")
+
+    with app.app_context():
+        key = Pet.query.filter_by(name="Sunny").first().image_key
+    assert key
+    with Image.open(tmp_path / f"{key}-100.webp") as variant:
+        assert variant.size == (100, 75)
+    assert (tmp_path / f"{key}-200.jpg").exists()
+
+    page = client.get("/dogs").data
+    assert f"/media/{key}-200.webp 200w".encode() in page
+
+    response = client.get(f"/media/{key}-100.jpg")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+    assert "max-age=31536000" in response.headers["Cache-Control"]
+
+    response = client.post("/pet/add", data={
+        "name": "Broken", "species": "Dog",
+        "image": (io.BytesIO(b"not an image"), "broken.png"),
+    }, content_type="multipart/form-data", follow_redirects=True)
+    assert b"not a supported image" in response.data
+    with app.app_context():
+        assert Pet.query.filter_by(name="Broken").first() is None
+
+    app.config['MAX_IMAGE_PIXELS'] = 100 * 100
+    huge = io.BytesIO()
+    Image.new("RGB", (400, 300), "blue").save(huge, "PNG")
+    response = client.post("/pet/add", data={
+        "name": "Huge", "species": "Dog",
+        "image": (io.BytesIO(huge.getvalue()), "huge.png"),
+    }, content_type="multipart/form-data", follow_redirects=True)
+    assert b"megapixels" in response.data
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+# Test 18 — Pet cards and admin rows are rendered once per pet version
+
+def test_fragment_cache_reuses_rendered_cards(app, client, admin_user):
+    with app.app_context():
+        pet = Pet(name="Cosmo", species="Cat", status="available")
+        db.session.add(pet)
+        db.session.commit()
+        pet_id = pet.id
+
+    cache = app.extensions['fragment_cache']
+    force_login(client, admin_user)
+
+    client.get("/cats")
+    client.get("/cats")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    client.get("/dashboard")
+    assert cache.misses == 2
+
+    client.post(f"/pet/{pet_id}/edit", data={
+        "name": "Cosmo II", "species": "Cat", "status": "available",
+    })
+    assert b"Cosmo II" in client.get("/cats").data
+    assert cache.misses == 3
+
+
+def test_fragment_version_covers_included_templates(app):
+    from jinja2 import ChoiceLoader, DictLoader
+    from app.fragments import template_version
+
+    partials = {"_outer.html": '<div>{% include "_inner.html" %}</div>', "_inner.html": "one"}
+    env = app.jinja_env
+    env.loader = ChoiceLoader([DictLoader(partials), env.loader])
+    env.auto_reload = True
+    with app.app_context():
+        before = template_version(env.get_template("_outer.html"))
+        assert template_version(env.get_template("_outer.html")) == before
+        partials["_inner.html"] = "two"
+        assert template_version(env.get_template("_outer.html")) != before
+
+
+# Test 19 — The admin dashboard streams rows as they are read
+
+def test_admin_dashboard_is_streamed_and_paginated(app, client, admin_user):
+    from datetime import datetime, timedelta
+
+    app.config['ADMIN_PETS_PER_PAGE'] = 2
+    with app.app_context():
+        start = datetime(2024, 1, 1)
+        db.session.add_all([Pet(name=f"Row{i}", species="Dog", created_at=start + timedelta(days=i))
+                            for i in range(3)])
+        db.session.commit()
+
+    force_login(client, admin_user)
+    client.post("/pet/add", data={"name": "Newest", "species": "Cat"})
+
+    response = client.get("/dashboard")
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert "Pet Newest added successfully!" in html
+    assert "Newest" in html and "Row2" in html and "Row1" not in html
+    assert "Older" in html and "Newer" not in html
+
+    older = html.split('after=')[1].split('"')[0]
+    html = client.get(f"/dashboard?after={older}").get_data(as_text=True)
+    assert "Row1" in html and "Row0" in html and "Newest" not in html
+    assert "added successfully" not in html
+    assert "Newer" in html and "Older" not in html
+
+
+# Test 20 — Responses and static files are compressed when accepted
+
+def test_html_and_streamed_responses_are_gzipped(app, client, admin_user):
+    import gzip
+
+    app.config['COMPRESS_ALGORITHMS'] = ['gzip']
+    with app.app_context():
+        db.session.add_all([Pet(name=f"Zip{i}", species="Dog", status="available") for i in range(5)])
+        db.session.commit()
+    force_login(client, admin_user)
+
+    response = client.get("/dogs", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert b"Zip4" in gzip.decompress(response.data)
+
+    response = client.get("/dashboard", headers={"Accept-Encoding": "gzip"})
+    assert response.is_streamed and response.headers["Content-Encoding"] == "gzip"
+    assert b"Zip0" in gzip.decompress(response.data)
+
+    assert "Content-Encoding" not in client.get("/dogs").headers
+
+
+def test_precompressed_static_files_are_served(app, client, tmp_path):
+    import gzip
+    from app.compression import precompress_folder
+
+    app.static_folder = str(tmp_path)
+    (tmp_path / "site.css").write_text("body { color: black; }\n" * 50)
+    (tmp_path / "photo.jpg").write_bytes(b"\xff\xd8" * 200)
+    assert precompress_folder(str(tmp_path)) >= 1
+    assert not (tmp_path / "photo.jpg.gz").exists()
+
+    response = client.get("/static/site.css", headers={"Accept-Encoding": "gzip"})
+    response.direct_passthrough = False
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.mimetype == "text/css"
+    assert gzip.decompress(response.get_data()).startswith(b"body")
+
+    plain = client.get("/static/site.css")
+    plain.direct_passthrough = False
+    assert "Content-Encoding" not in plain.headers
+    assert plain.get_data().startswith(b"body")
+
+
+# Test 21 — Startup skips schema work once the database is current
+
+def test_init_database_checks_schema_version(app, monkeypatch):
+    from app.schema import SCHEMA_VERSION, init_database, stored_schema_version
+
+    with app.app_context():
+        assert stored_schema_version() == SCHEMA_VERSION
+        assert init_database() is False
+    assert app.config['STARTUP_SECONDS'] > 0
+
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    with pytest.raises(RuntimeError):
+        create_app('production')
+
+
+# Test 22 — SQLite connections use WAL and the tuned pragmas
+
+def test_sqlite_connections_are_tuned(tmp_path, monkeypatch):
+    from app.database import engine_options
+
+    # A file database of its own: WAL does not apply to in-memory databases
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/t.db")
+    tuned = create_app()
+    with tuned.app_context():
+        with db.engine.connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+            # synchronous=NORMAL is 1
+            assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+            assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == \
+                tuned.config['SQLITE_BUSY_TIMEOUT_MS']
+        db.engine.dispose()
+    assert (tmp_path / "t.db").exists()
+
+    config = dict(tuned.config, SQLALCHEMY_DATABASE_URI='postgresql://pawfect@db/pawfect')
+    options = engine_options(config)
+    assert options['pool_size'] == tuned.config['DB_POOL_SIZE']
+    assert options['pool_pre_ping'] is True
+    assert engine_options(tuned.config) == {}
+
+
+# Test 23 — JSON API lists, filters and validates pets
+
+def test_api_lists_pets_with_fields_and_etags(app, client, admin_user):
+    with app.app_context():
+        db.session.add_all([
+            Pet(name="Rex", species="Dog", breed="Collie", age="2 years", status="available"),
+            Pet(name="Tom", species="Cat", breed="Tabby", age="4 years", status="available"),
+            Pet(name="Old", species="Dog", age="9 years", status="adopted"),
+        ])
+        db.session.commit()
+
+    with app.app_context():  # fresh g, so the anonymous user isn't remembered
+        assert client.get("/api/v1/pets").status_code == 401
+    force_login(client, admin_user)
+
+    response = client.get("/api/v1/pets?species=dog&fields=name,breed")
+    assert response.status_code == 200
+    assert response.json["data"] == [{"id": response.json["data"][0]["id"],
+                                      "name": "Rex", "breed": "Collie"}]
+    assert response.json["links"] == {"next": None, "prev": None}
+
+    again = client.get("/api/v1/pets?species=dog&fields=name,breed",
+                       headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+
+    pet_id = response.json["data"][0]["id"]
+    detail = client.get(f"/api/v1/pets/{pet_id}?fields=age_months")
+    assert detail.json == {"data": {"id": pet_id, "age_months": 24}}
+
+    assert client.get("/api/v1/pets?fields=password_hash").status_code == 400
+    assert client.get("/api/v1/pets/999999").json == {"error": "Pet not found."}
+
+    found = client.get("/api/v1/pets/search?q=tabb&fields=name")
+    assert [pet["name"] for pet in found.json["data"]] == ["Tom"]
+
+
+# Test 24 — JSON API pages with cursors
+
+def test_api_cursor_pagination(app, client, admin_user):
+    with app.app_context():
+        db.session.add_all(Pet(name=f"Cat {i}", species="Cat", status="available")
+                           for i in range(5))
+        db.session.commit()
+    force_login(client, admin_user)
+
+    names = []
+    url = "/api/v1/pets?species=Cat&limit=2&fields=name"
+    while url:
+        page = client.get(url).json
+        names += [pet["name"] for pet in page["data"]]
+        url = page["links"]["next"]
+    assert sorted(names) == [f"Cat {i}" for i in range(5)]
+
+
+# Test 25 — Pet writes record events that stream to subscribers
+
+def test_pet_events_recorded_and_streamed(app, client, admin_user):
+    from app.models import PetEvent
+
+    force_login(client, admin_user)
+    client.post("/pet/add", data={"name": "Nala", "species": "Cat", "age_value": "1",
+                                  "age_unit": "years"})
+    with app.app_context():
+        pet_id = Pet.query.filter_by(name="Nala").one().id
+    client.post(f"/pet/{pet_id}/edit", data={"name": "Nala", "species": "Cat", "age_value": "1",
+                                             "age_unit": "years", "status": "adopted"})
+    client.post(f"/pet/{pet_id}/delete")
+
+    with app.app_context():
+        events = db.session.execute(db.select(PetEvent.kind, PetEvent.status)
+                                    .order_by(PetEvent.id)).all()
+    assert [tuple(event) for event in events] == [
+        ("added", "available"), ("status", "adopted"), ("deleted", "adopted")]
+
+    app.config['EVENT_STREAM_MAX_SECONDS'] = 0
+    response = client.get("/events/pets?species=cat", headers={"Last-Event-ID": "0"})
+    assert response.mimetype == "text/event-stream"
+    body = response.get_data(as_text=True)
+    assert body.startswith("retry: ")
+    assert body.count("event: ") == 3 and f'"pet_id": {pet_id}' in body
+    assert "event: added" not in client.get("/events/pets?species=dog",
+                                            headers={"Last-Event-ID": "0"}).get_data(as_text=True)
+
+
+# Test 26 — Event broker fans out new events and drops clients that fall behind
+
+def test_event_broker_fan_out_and_overflow(app):
+    from app.events import ADDED, Subscriber, record_pet_event
+
+    broker = app.extensions['event_broker']
+    with app.app_context():
+        broker.last_id = 0
+        cats, slow = Subscriber("Cat"), Subscriber(maxsize=1)
+        broker.subscribers.update({cats, slow})
+        for name, species in (("A", "Cat"), ("B", "Dog")):
+            pet = Pet(name=name, species=species, status="available")
+            db.session.add(pet)
+            db.session.flush()
+            record_pet_event(ADDED, pet)
+        db.session.commit()
+        broker.poll()
+        broker.subscribers.clear()
+
+    assert cats.queue.qsize() == 1 and not cats.overflowed
+    assert slow.queue.qsize() == 1 and slow.overflowed
+
+
+def test_event_broker_delivers_events_committed_out_of_order(app):
+    from app.events import Subscriber
+    from app.models import PetEvent
+
+    broker = app.extensions['event_broker']
+    with app.app_context():
+        broker.last_id = 0
+        subscriber = Subscriber()
+        broker.subscribers.add(subscriber)
+        # Id 1 is still being written when id 2 commits, as PostgreSQL allows
+        db.session.add(PetEvent(id=2, pet_id=2, kind="added", species="Dog", status="available"))
+        db.session.commit()
+        broker.poll()
+        db.session.add(PetEvent(id=1, pet_id=1, kind="added", species="Cat", status="available"))
+        db.session.commit()
+        broker.poll()
+        broker.subscribers.clear()
+
+    (first_id, first), (late_id, late) = subscriber.queue.get(), subscriber.queue.get()
+    assert (first_id, late_id) == (2, 1) and broker.gaps == {}
+    assert first.startswith("id: 2\n")
+    # Late events leave the client's resume position at the highest id
+    assert late.startswith("event: added\n") and '"pet_id": 1' in late
+
+
+def test_listing_pages_subscribe_to_pet_events(app, client, admin_user):
+    force_login(client, admin_user)
+    body = client.get("/cats").get_data(as_text=True)
+    assert 'new EventSource("/events/pets?species=Cat")' in body
+
+
+# Test 27 — /metrics reports request latency, SQL counts and cache hits
+
+def test_metrics_endpoint(app, client, admin_user):
+    force_login(client, admin_user)
+    client.get("/dashboard").close()
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'http_requests_total{endpoint="main.dashboard",method="GET",status="200"' in body
+    assert 'http_request_duration_seconds_count{endpoint="main.dashboard",method="GET"' in body
+    assert 'http_request_sql_queries_bucket{endpoint="main.dashboard",le="+Inf"' in body
+    assert 'template_render_seconds_count{template="admin_dashboard.html"' in body
+    assert 'cache_misses_total{cache="user_cache"' in body
+
+    app.config['METRICS_TOKEN'] = 's3cret'
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+# Test 28 — Query budgets, N+1 detection and slow query logging
+
+def test_query_budgets_and_slow_query_log(app, client, admin_user, query_log, caplog):
+    force_login(client, admin_user)
+    client.get("/dogs")
+    [statements] = query_log.statements("main.view_dogs")
+    assert 0 < len(statements) <= app.view_functions["main.view_dogs"].query_budget
+
+    query_log.requests.append(("GET", "main.view_cats", "/cats", ["SELECT 1"] * 6))
+    problems = query_log.problems(app)
+    assert any("over its budget of 5" in problem for problem in problems)
+    assert any("N+1" in problem for problem in problems)
+    query_log.requests.pop()
+
+    app.config['SLOW_QUERY_MS'] = 1e-6
+    with caplog.at_level("WARNING", logger="app.sql"):
+        client.get("/api/v1/pets/1")
+    slow = [record.message for record in caplog.records if record.message.startswith("Slow query")]
+    assert slow and not any("parameters" in message for message in slow)
+
+    caplog.clear()
+    app.config['SLOW_QUERY_LOG_PARAMETERS'] = True
+    with caplog.at_level("WARNING", logger="app.sql"):
+        client.get("/api/v1/pets/1")
+    assert any(record.message.startswith("Slow query") and "parameters" in record.message
+               for record in caplog.records)
+
+
+# Test 29 — Adopters save preferences and see pets ranked by match
+
+def test_preferences_rank_best_matches(app, client):
+    with app.app_context():
+        adopter = User(username="ada", email="ada@example.com")
+        adopter.set_password("test123")
+        db.session.add(adopter)
+        db.session.add_all([
+            Pet(name="Rex", species="Dog", age="2 years", gender="Male", vaccinated=True,
+                description="Calm and gentle", status="available"),
+            Pet(name="Bolt", species="Dog", age="9 years", gender="Female",
+                description="Loves running", status="available"),
+            Pet(name="Milo", species="Cat", age="2 years", gender="Male", vaccinated=True,
+                description="Calm lap cat", status="available"),
+            Pet(name="Old Yeller", species="Dog", age="2 years", status="adopted"),
+        ])
+        db.session.commit()
+
+    force_login(client, adopter)
+    assert client.get("/matches").status_code == 302
+    response = client.post("/preferences", data={
+        "species": "Dog", "min_age_years": "1", "max_age_years": "3", "gender": "Male",
+        "vaccinated": "on", "keywords": "calm"}, follow_redirects=True)
+    body = response.get_data(as_text=True)
+    assert "100% match" in body
+    assert body.index("Rex") < body.index("Bolt")
+    assert "Milo" not in body and "Old Yeller" not in body
+
+
+def test_preferences_reject_unbounded_ages(app, client):
+    from app.models import AdopterPreference
+
+    with app.app_context():
+        adopter = User(username="ada", email="ada@example.com")
+        adopter.set_password("test123")
+        db.session.add(adopter)
+        db.session.commit()
+
+    force_login(client, adopter)
+    for field, value in (("max_age_years", "inf"), ("min_age_years", "1e30")):
+        response = client.post("/preferences", data={field: value}, follow_redirects=True)
+        assert response.status_code == 200
+        assert b"Ages must be between 0 and 30 years." in response.data
+    with app.app_context():
+        assert db.session.get(AdopterPreference, adopter.id) is None
+
+
+# Test 30 — The match engine follows pet writes incrementally
+
+def test_match_engine_incremental_refresh(app, client, admin_user):
+    from app.cache import LISTINGS, bump_version
+    from app.models import AdopterPreference
+
+    engine = app.extensions['match_engine']
+    preference = AdopterPreference(species="Cat", keywords="shy")
+    force_login(client, admin_user)
+    client.post("/pet/add", data={"name": "Nala", "species": "Cat", "description": "Shy"})
+    with app.app_context():
+        nala = Pet.query.filter_by(name="Nala").one().id
+        assert engine.best_matches(preference) == [(nala, 1.0)]
+        matrix = engine.matrix
+
+    client.post("/pet/add", data={"name": "Tom", "species": "Cat"})
+    client.post(f"/pet/{nala}/edit", data={"name": "Nala", "species": "Cat",
+                                           "status": "adopted"})
+    with app.app_context():
+        tom = Pet.query.filter_by(name="Tom").one().id
+        assert engine.best_matches(preference) == [(tom, 0.0)]
+        assert engine.matrix is matrix and len(matrix) == 1
+
+    client.post(f"/pet/{tom}/delete")
+    with app.app_context():
+        assert engine.best_matches(preference) == []
+        # A version bump without missed events refreshes in place
+        bump_version(LISTINGS)
+        db.session.commit()
+        engine.best_matches(preference)
+        assert engine.matrix is matrix
+
+    # Bulk imports record no events; they are applied without a rebuild, even
+    # once every earlier event has been pruned
+    import io
+    from app.importer import import_pets
+    from app.models import PetEvent
+    with app.app_context():
+        db.session.execute(db.delete(PetEvent))
+        db.session.commit()
+        import_pets(io.StringIO("name,species,description\nMochi,Cat,Shy\n"), "csv")
+        mochi = Pet.query.filter_by(name="Mochi").one().id
+        assert engine.best_matches(preference) == [(mochi, 1.0)]
+        assert engine.matrix is matrix
+
+
+# Test 31 — Saved searches queue alerts for newly available matching pets
+
+def test_saved_search_alerts(app, client, admin_user):
+    from app.models import Notification
+
+    with app.app_context():
+        adopter = User(username="ada", email="ada@example.com")
+        adopter.set_password("test123")
+        db.session.add(adopter)
+        db.session.commit()
+    # Each user's requests get their own app context, so the logged-in user is not shared
+    with app.app_context():
+        force_login(client, adopter)
+        client.post("/saved-searches", data={"species": "Dog", "age": "1-3", "vaccinated": "1"})
+        client.post("/saved-searches", data={"species": "Cat"})
+
+    with app.app_context():
+        force_login(client, admin_user)
+        client.post("/pet/add", data={"name": "Rex", "species": "Dog", "age_value": "2",
+                                      "age_unit": "years", "vaccinated": "on"})
+        client.post("/pet/add", data={"name": "Bolt", "species": "Dog", "age_value": "2",
+                                      "age_unit": "years"})
+        rex = Pet.query.filter_by(name="Rex").one().id
+        for status in ("pending", "available"):
+            client.post(f"/pet/{rex}/edit", data={"name": "Rex", "species": "Dog",
+                                                  "age_value": "2", "age_unit": "years",
+                                                  "status": status})
+        assert [n.pet_id for n in Notification.query.all()] == [rex]
+
+    with app.app_context():
+        force_login(client, adopter)
+        body = client.get("/saved-searches").get_data(as_text=True)
+        assert "Rex</a>" in body and "Bolt</a>" not in body
+        # Viewing the page does not consume alerts; acknowledging them does
+        assert "Rex</a>" in client.get("/saved-searches").get_data(as_text=True)
+        notification = Notification.query.one()
+        client.post("/saved-searches/alerts/seen", data={"up_to": notification.id})
+        assert "Rex</a>" not in client.get("/saved-searches").get_data(as_text=True)
+
+        from app.models import SavedSearch
+        cats = SavedSearch.query.filter_by(species="Cat").one()
+        client.post(f"/saved-searches/{cats.id}/delete")
+        assert SavedSearch.query.filter_by(removed_at=None).count() == 1
+        assert client.post(f"/saved-searches/{cats.id}/delete").status_code == 404
+
+
+# Test 32 — The criteria index only finds searches a pet satisfies
+
+def test_saved_search_index_matches_by_criteria(app):
+    from datetime import datetime
+    from types import SimpleNamespace
+    from app.cache import SAVED_SEARCHES, bump_version
+    from app.models import SavedSearch
+
+    with app.app_context():
+        user = User(username="ada", email="ada@example.com")
+        user.set_password("test123")
+        db.session.add(user)
+        db.session.flush()
+        searches = [SavedSearch(user_id=user.id, **criteria) for criteria in (
+            {},
+            {"species": "Cat", "gender": "Female"},
+            {"species": "Cat", "age_bucket": "under-1", "spayed_neutered": True},
+            {"species": "Dog"},
+            {"species": "Cat", "vaccinated": True},
+        )]
+        db.session.add_all(searches)
+        bump_version(SAVED_SEARCHES)
+        db.session.commit()
+
+        kitten = SimpleNamespace(species="Cat", gender="Female", age_months=4,
+                                 vaccinated=False, spayed_neutered=True)
+        index = app.extensions['saved_search_index']
+        found = sorted(search_id for search_id, _ in index.matches(kitten))
+        assert found == [searches[0].id, searches[1].id, searches[2].id]
+
+        # Saves and removals since the last refresh are applied in place
+        searches[1].removed_at = datetime.utcnow()
+        added = SavedSearch(user_id=user.id, species="Cat", gender="Female")
+        db.session.add(added)
+        bump_version(SAVED_SEARCHES)
+        db.session.commit()
+        found = sorted(search_id for search_id, _ in index.matches(kitten))
+        assert found == [searches[0].id, searches[2].id, added.id]